@@ -21,7 +21,7 @@ POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
-database_url = os.getenv("DATABASE_URL")
+database_url = config.attributes.get("database_url") or os.getenv("DATABASE_URL")  # app.core.migrate passes its own
 if not database_url:
     database_url = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:5432/{POSTGRES_DB}"
 database_url = str(database_url).replace(
@@ -30,10 +30,14 @@ database_url = str(database_url).replace(
 )
 config.set_main_option("sqlalchemy.url", database_url)
 
+# DDL waiting on a lock queues every later query on the table behind it, so give up
+# quickly and let the migration be retried instead of stalling live traffic
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -84,8 +88,14 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        connection.exec_driver_sql(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'")
+        connection.commit()
+
+        # One transaction per revision, so a revision running online steps
+        # (app.core.online_migrations) doesn't hold the earlier ones open
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            transaction_per_migration=True
         )
 
         with context.begin_transaction():
@@ -0,0 +1,41 @@
+"""car cache invalidation trigger
+
+Revision ID: 882ff9e08875
+Revises: fedee8b3d27d
+Create Date: 2026-03-04 16:41:09.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '882ff9e08875'
+down_revision: Union[str, Sequence[str], None] = 'fedee8b3d27d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Notify every API worker about changed cars, delivered on commit
+    op.execute("""
+        CREATE FUNCTION notify_car_cache_invalidate() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('car_cache_invalidate', OLD.id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER cars_car_cache_invalidate
+        AFTER UPDATE OR DELETE ON cars
+        FOR EACH ROW EXECUTE FUNCTION notify_car_cache_invalidate()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER cars_car_cache_invalidate ON cars")
+    op.execute("DROP FUNCTION notify_car_cache_invalidate()")
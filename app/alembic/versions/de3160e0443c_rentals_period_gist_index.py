@@ -0,0 +1,31 @@
+"""rentals period gist index
+
+Revision ID: de3160e0443c
+Revises: ecb9331d36eb
+Create Date: 2026-03-09 14:02:17.694801
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from app.core.online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'de3160e0443c'
+down_revision: Union[str, Sequence[str], None] = 'ecb9331d36eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_concurrently('ix_rentals_period', 'rentals',
+                              [sa.text("tstzrange(start_date, end_date, '[]')")],
+                              unique=False, postgresql_using='gist')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_rentals_period', 'rentals')
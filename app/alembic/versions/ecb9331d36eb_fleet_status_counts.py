@@ -0,0 +1,87 @@
+"""fleet status counts
+
+Revision ID: ecb9331d36eb
+Revises: 882ff9e08875
+Create Date: 2026-03-06 09:27:52.830114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecb9331d36eb'
+down_revision: Union[str, Sequence[str], None] = '882ff9e08875'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fleet_status_deltas',
+    sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('delta', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Hold off writers until the triggers exist, so no write lands between seed and triggers
+    op.execute("LOCK TABLE cars IN SHARE ROW EXCLUSIVE MODE")
+
+    # Statement level triggers append one aggregated delta row per status. Writers only
+    # ever insert, so concurrent bookings and bulk writes never wait on each other here.
+    op.execute("""
+        CREATE FUNCTION apply_fleet_status_deltas() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO fleet_status_deltas (status, delta)
+                SELECT status, count(*) FROM new_rows GROUP BY status;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO fleet_status_deltas (status, delta)
+                SELECT status, -count(*) FROM old_rows GROUP BY status;
+            ELSE
+                INSERT INTO fleet_status_deltas (status, delta)
+                SELECT status, sum(delta) FROM (
+                    SELECT status, count(*) AS delta FROM new_rows GROUP BY status
+                    UNION ALL
+                    SELECT status, -count(*) AS delta FROM old_rows GROUP BY status
+                ) d
+                GROUP BY status
+                HAVING sum(delta) <> 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER cars_fleet_status_deltas_insert
+        AFTER INSERT ON cars REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_fleet_status_deltas()
+    """)
+    op.execute("""
+        CREATE TRIGGER cars_fleet_status_deltas_update
+        AFTER UPDATE ON cars REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_fleet_status_deltas()
+    """)
+    op.execute("""
+        CREATE TRIGGER cars_fleet_status_deltas_delete
+        AFTER DELETE ON cars REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_fleet_status_deltas()
+    """)
+
+    # Seed with the current fleet
+    op.execute("""
+        INSERT INTO fleet_status_deltas (status, delta)
+        SELECT status, count(*) FROM cars GROUP BY status
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER cars_fleet_status_deltas_delete ON cars")
+    op.execute("DROP TRIGGER cars_fleet_status_deltas_update ON cars")
+    op.execute("DROP TRIGGER cars_fleet_status_deltas_insert ON cars")
+    op.execute("DROP FUNCTION apply_fleet_status_deltas()")
+    op.drop_table('fleet_status_deltas')
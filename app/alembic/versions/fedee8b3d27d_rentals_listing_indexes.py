@@ -0,0 +1,34 @@
+"""rentals listing indexes
+
+Revision ID: fedee8b3d27d
+Revises: e5bce07c98e6
+Create Date: 2026-03-02 10:14:31.207415
+
+"""
+from typing import Sequence, Union
+
+from app.core.online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fedee8b3d27d'
+down_revision: Union[str, Sequence[str], None] = 'e5bce07c98e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built concurrently, rentals keeps taking bookings meanwhile
+    create_index_concurrently('ix_rentals_car_id_id', 'rentals', ['car_id', 'id'], unique=False)
+    create_index_concurrently('ix_rentals_customer_name_id', 'rentals', ['customer_name', 'id'], unique=False)
+    create_index_concurrently('ix_rentals_start_date', 'rentals', ['start_date'], unique=False)
+    create_index_concurrently('ix_rentals_end_date', 'rentals', ['end_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_rentals_end_date', 'rentals')
+    drop_index_concurrently('ix_rentals_start_date', 'rentals')
+    drop_index_concurrently('ix_rentals_customer_name_id', 'rentals')
+    drop_index_concurrently('ix_rentals_car_id_id', 'rentals')
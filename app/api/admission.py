@@ -0,0 +1,162 @@
+# API
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from time import perf_counter, monotonic
+
+# Types
+from typing import List, Optional
+
+# Config
+from app.core.config import settings
+
+# Database
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.database import engine, read_engine, read_sessionmaker_for, AsyncReadSessionLocal
+
+# Observability
+from prometheus_client import Counter, Gauge
+from app.core.logger import logger
+
+ADMISSION_LIMIT = Gauge("api_admission_limit", "Current cap on in flight API requests",
+                        multiprocess_mode="livesum")
+ADMISSION_IN_FLIGHT = Gauge("api_admission_in_flight", "API requests currently admitted",
+                            multiprocess_mode="livesum")
+ADMISSION_SHED = Counter("api_requests_shed", "API requests rejected with 503 by admission control")
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for database bound requests.
+
+    Every request completing under `latency_target_ms`, with a free pool connection left,
+    grows the limit by 1/limit (about +1 per limit's worth of requests). A slow or failed
+    request, or one finishing while the pool is exhausted, shrinks it by `backoff`, at most
+    once per target latency so one slow burst counts once. By Little's law the limit then
+    settles near throughput x target latency, the most the database serves without queueing.
+    """
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float,
+                 latency_target_ms: float, backoff: float, pool_capacity: int):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_ms = latency_target_ms
+        self.backoff = backoff
+        self.pool_capacity = pool_capacity
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        ADMISSION_LIMIT.set(self.limit)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc()
+        return True
+
+    def release(self, latency_ms: float, failed: bool, pool_checked_out: Optional[int] = None) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec()
+
+        pool_exhausted = pool_checked_out is not None and pool_checked_out >= self.pool_capacity
+        if failed or pool_exhausted or latency_ms > self.latency_target_ms:
+            now = monotonic()
+            if (now - self._last_decrease) * 1000 >= self.latency_target_ms:
+                self._last_decrease = now
+                self.limit = max(self.limit * self.backoff, self.min_limit)
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+        ADMISSION_LIMIT.set(self.limit)
+
+
+def _engine_for(request: Request) -> AsyncEngine:
+    """
+    The engine whose pool serves `request`, reads go to the replica unless pinned to the primary.
+    """
+    if request.method in ("GET", "HEAD") and read_sessionmaker_for(request) is AsyncReadSessionLocal:
+        return read_engine
+    return engine
+
+
+def _pool_checked_out(request: Request) -> int:
+    return _engine_for(request).sync_engine.pool.checkedout()
+
+
+pool_size, max_overflow = settings.worker_pool_limits
+admission_limiter = AdaptiveLimiter(
+    initial=2 * (pool_size + max_overflow),
+    min_limit=settings.ADMISSION_MIN_LIMIT,
+    max_limit=settings.ADMISSION_MAX_LIMIT,
+    latency_target_ms=settings.ADMISSION_LATENCY_TARGET_MS,
+    backoff=settings.ADMISSION_BACKOFF,
+    pool_capacity=pool_size + max_overflow
+)
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds requests over the limiter's limit with a 503, for paths under `prefixes`.
+
+    An admitted request holds its slot until the last body chunk is sent, so a streaming
+    response keeps it for as long as it reads from the database. The latency fed to the
+    limiter is the time to the response start, a long stream is not a slow request.
+    """
+
+    def __init__(self, app: ASGIApp, prefixes: List[str], limiter: AdaptiveLimiter = admission_limiter):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        # only database bound paths are limited, health and metrics stay reachable
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+
+        # shed right away instead of queueing on the pool until the client gives up
+        if not self.limiter.try_acquire():
+            ADMISSION_SHED.inc()
+            logger.debug("Shedding %s %s, %s requests in flight", request.method, request.url.path, self.limiter.in_flight)
+            response = JSONResponse(status_code=503,
+                                    content={"detail": "Server is overloaded, retry later"},
+                                    headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)})
+            await response(scope, receive, send)
+            return
+
+        start = perf_counter()
+        latency_ms: Optional[float] = None
+        failed = True
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.limiter.release(latency_ms if latency_ms is not None else (perf_counter() - start) * 1000,
+                                 failed, _pool_checked_out(request))
+
+        async def send_and_release(message: Message) -> None:
+            nonlocal latency_ms, failed
+            if message["type"] == "http.response.start":
+                latency_ms = (perf_counter() - start) * 1000
+                failed = message["status"] >= 500
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            release()
+
+
+def limit_concurrency_for_prefixes(app, prefixes: List[str], limiter: AdaptiveLimiter = admission_limiter):
+    app.add_middleware(AdmissionControlMiddleware, prefixes=prefixes, limiter=limiter)
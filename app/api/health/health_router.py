@@ -3,7 +3,7 @@
 from app.services.HealthService import HealthService
 
 # API Deps
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 router = APIRouter(prefix="/health", tags=["Health"])
 
 # Session
@@ -14,7 +14,7 @@ from app.core.database import get_db_session
 from app.core.logger import logger
 
 # Response
-from app.models.validations.responses import PingResp, DBHealthCheckResp
+from app.models.validations.responses import PingResp, DBHealthCheckResp, ReadinessResp
 
 @router.get("/ping", response_model=PingResp)
 async def ping():
@@ -24,9 +24,19 @@ async def ping():
 
 
 @router.get("/db", response_model=DBHealthCheckResp)
-async def health_check(db: AsyncSession = Depends(get_db_session)):
+async def health_check(db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info("Testing DB for connectivity.")
+    logger.debug("Testing DB for connectivity.")
     resp = await HealthService.db_health(db=db)
-    logger.info("Valid DB connection!")
+    logger.debug("Valid DB connection!")
+    return {"msg": resp}
+
+
+@router.get("/ready", response_model=ReadinessResp)
+async def readiness(request: Request):
+    """
+    Ready once startup warm up is done, and no longer once shutdown has begun
+    """
+
+    resp = await HealthService.readiness(ready=getattr(request.app.state, "ready", False))
     return {"msg": resp}
@@ -8,9 +8,16 @@ from app.api.metrics.metrics_router import router as metrics_router
 # Observability
 from app.api.metrics.metrics import track_latency_for_prefixes
 
+# Load shedding
+from app.api.admission import limit_concurrency_for_prefixes
+
+# Lifecycle
+from app.core.lifecycle import lifespan
+
 # App
-app = FastAPI(title="DriveNow", version="1.0.0")
+app = FastAPI(title="DriveNow", version="1.0.0", lifespan=lifespan)
 track_latency_for_prefixes(app, prefixes=["/v1"])
+limit_concurrency_for_prefixes(app, prefixes=["/v1"])  # added last, so it runs first and sheds before any tracking
 app.include_router(v1_router)
 app.include_router(health_router)
 app.include_router(metrics_router)
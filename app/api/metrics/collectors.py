@@ -0,0 +1,82 @@
+
+# Functionality
+import asyncio
+from time import monotonic
+
+# Types
+from typing import Dict, Optional
+
+# Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Service
+from app.services.MetricService import MetricService
+
+# Config
+from app.core.config import settings
+
+# Observability
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from app.core.metrics_registry import register_collector
+from app.core.logger import logger
+
+
+class FleetGaugeCollector(Collector):
+    """
+    Publishes database derived fleet gauges on scrape.
+
+    Prometheus collectors are synchronous, so the values are refreshed by the
+    exposition endpoint through `refresh()` and only served from memory here. A
+    refresh within `min_interval` seconds of the last one is a no-op, and
+    concurrent scrapes share a single refresh.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._refreshed_at: Optional[float] = None
+        self._status_counts: Dict[str, int] = {}
+        self._ongoing_rentals: Optional[int] = None
+
+    def _is_fresh(self) -> bool:
+        return self._refreshed_at is not None and monotonic() - self._refreshed_at < self.min_interval
+
+    async def refresh(self, db: AsyncSession) -> None:
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            if self._is_fresh():  # refreshed while we waited
+                return
+
+            try:
+                self._status_counts = await MetricService.get_fleet_status_counts(db=db)
+                self._ongoing_rentals = await MetricService.get_ongoing_rentals(db=db)
+            except Exception as e:
+                # Keep serving the last values, retry after the interval
+                logger.warning("Cannot refresh fleet gauges: %s", e)
+            self._refreshed_at = monotonic()
+
+    def describe(self):
+        yield GaugeMetricFamily("fleet_cars", "Cars in the fleet")
+        yield GaugeMetricFamily("fleet_cars_by_status", "Cars in the fleet by status", labels=["status"])
+        yield GaugeMetricFamily("rentals_ongoing", "Rentals with start_date <= now <= end_date")
+
+    def collect(self):
+        if self._ongoing_rentals is None:  # not refreshed yet
+            return
+
+        yield GaugeMetricFamily("fleet_cars", "Cars in the fleet", value=sum(self._status_counts.values()))
+
+        by_status = GaugeMetricFamily("fleet_cars_by_status", "Cars in the fleet by status", labels=["status"])
+        for car_status, count in self._status_counts.items():
+            by_status.add_metric([car_status], count)
+        yield by_status
+
+        yield GaugeMetricFamily("rentals_ongoing", "Rentals with start_date <= now <= end_date",
+                                value=self._ongoing_rentals)
+
+
+fleet_gauges = FleetGaugeCollector(min_interval=settings.METRICS_DB_GAUGE_MIN_INTERVAL_SECONDS)
+register_collector(fleet_gauges)
@@ -6,13 +6,39 @@ from time import perf_counter
 # Types
 from typing import List
 
+# Config
+from app.core.config import settings
+
 # Observability
 from prometheus_client import Histogram
+from app.core.latency_window import rolling_latency
+from app.core.logger import request_logger, should_log_request
+
+# Label for requests that matched no route, keeps label cardinality bounded
+UNMATCHED_ROUTE = "__unmatched__"
 
-# Define a histogram for API request latency
+# Methods labelled as sent, any other method a client makes up is labelled OTHER
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+OTHER_METHOD = "OTHER"
+
+# Request latency per route template, method and status code
 REQUEST_LATENCY = Histogram(
     "api_request_latency_ms",
-    "API request latency in ms"
+    "API request latency in ms",
+    ["route", "method", "status"],
+    buckets=settings.METRICS_LATENCY_BUCKETS_MS
+)
+REQUEST_SIZE = Histogram(
+    "api_request_size_bytes",
+    "API request body size in bytes",
+    ["route", "method"],
+    buckets=settings.METRICS_SIZE_BUCKETS_BYTES
+)
+RESPONSE_SIZE = Histogram(
+    "api_response_size_bytes",
+    "API response body size in bytes, for responses that declare a content-length",
+    ["route", "method", "status"],
+    buckets=settings.METRICS_SIZE_BUCKETS_BYTES
 )
 
 def track_latency_for_prefixes(app, prefixes: List[str]):
@@ -20,16 +46,46 @@ def track_latency_for_prefixes(app, prefixes: List[str]):
     @app.middleware("http")
     async def track_latency(request: Request, call_next):
 
-        # get request path
-        route = request.scope.get("route")
-        route_path = getattr(route, "path", request.url.path)
-
         # verify its a tracked path
-        if any(route_path.startswith(p) for p in prefixes):
-            start = perf_counter()
+        if not any(request.url.path.startswith(p) for p in prefixes):
+            return await call_next(request)
+
+        start = perf_counter()
+        status_code = 500
+        response = None
+        try:
             response = await call_next(request)
-            duration = (perf_counter() - start) * 1000
-            REQUEST_LATENCY.observe(duration)
+            status_code = response.status_code
             return response
-        else:
-            return await call_next(request)
\ No newline at end of file
+
+        finally:
+            duration = (perf_counter() - start) * 1000
+
+            # the route template is only known once routing has happened, a 405 matched
+            # the path but no route, and is labelled like an unmatched request
+            route = getattr(request.scope.get("route"), "path", UNMATCHED_ROUTE)
+            if status_code == 405:
+                route = UNMATCHED_ROUTE
+            method = request.method if request.method in KNOWN_METHODS else OTHER_METHOD
+            status_label = str(status_code)
+
+            REQUEST_LATENCY.labels(route, method, status_label).observe(duration)
+            rolling_latency.record(method, route, duration)
+            request_size = int(request.headers.get("content-length", 0))
+            response_size = None
+            REQUEST_SIZE.labels(route, method).observe(request_size)
+            if response is not None and "content-length" in response.headers:
+                response_size = int(response.headers["content-length"])
+                RESPONSE_SIZE.labels(route, method, status_label).observe(response_size)
+
+            # fields are only built for requests that get logged
+            if should_log_request(route, status_code):
+                request_logger.info("request", extra={"fields": {
+                    "method": method,
+                    "route": route,
+                    "path": request.url.path,
+                    "status": status_code,
+                    "duration_ms": round(duration, 2),
+                    "request_bytes": request_size,
+                    "response_bytes": response_size
+                }})
@@ -1,43 +1,76 @@
 
 # Routing
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, HTTPException, status, Response
 router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
+# Config
+from app.core.config import settings
+
 # Service
 from app.services.MetricService import MetricService
 
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db_session
+from app.core.database import get_read_db_session
 
 # Observability
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from app.core.metrics_registry import metrics_registry
+from app.api.metrics.collectors import fleet_gauges
 from app.core.logger import logger
 
 # Responses
-from app.models.validations.responses import GetActiveCarsResp, GetOngoingRentalsResp, GetAverageResponseTimeResp
+from app.models.validations.responses import GetActiveCarsResp, GetFleetStatusResp, GetOngoingRentalsResp, GetAverageResponseTimeResp, GetLatencyPercentilesResp
+from app.core.latency_window import RollingLatency, rolling_latency
+
+@router.get("", include_in_schema=False)
+async def get_prometheus_metrics(db: AsyncSession = Depends(get_read_db_session, scope="function")):
+    """
+    Prometheus text exposition of every registered metric, aggregated over workers
+    """
+
+    await fleet_gauges.refresh(db=db)
+    return Response(content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
 
 @router.get("/activecars", response_model=GetActiveCarsResp)
-async def get_active_cars(db: AsyncSession = Depends(get_db_session)):
+async def get_active_cars(db: AsyncSession = Depends(get_read_db_session, scope="function")):
     """
     Define active cars as cars in the fleet
     """
 
-    logger.info("Getting active Cars count")
+    logger.debug("Getting active Cars count")
     active_cars_count = await MetricService.get_active_cars(db=db)
-    logger.info(f"Successfully got car count: {active_cars_count}")
+    logger.debug("Successfully got car count: %s", active_cars_count)
 
     resp = {"active_cars": active_cars_count}
     return resp
 
+@router.get("/fleetstatus", response_model=GetFleetStatusResp)
+async def get_fleet_status(db: AsyncSession = Depends(get_read_db_session, scope="function")):
+    """
+    Break the fleet down by car status
+    """
+
+    logger.debug("Getting fleet status counts")
+    counts = await MetricService.get_fleet_status_counts(db=db)
+    logger.debug("Successfully got fleet status counts: %s", counts)
+
+    resp = {"available": counts["available"],
+            "in_use": counts["in use"],
+            "under_maintenance": counts["under maintenance"],
+            "total": sum(counts.values())
+    }
+    return resp
+
 @router.get("/ongoingrentals", response_model=GetOngoingRentalsResp)
-async def get_ongoing_rentals(db: AsyncSession = Depends(get_db_session)):
+async def get_ongoing_rentals(db: AsyncSession = Depends(get_read_db_session, scope="function")):
     """
     Define ongoing rentals as rentals that have start_date <= now <= end_date
     """
 
-    logger.info("Getting ongoing rentals count")
+    logger.debug("Getting ongoing rentals count")
     ongoing_rentals_count = await MetricService.get_ongoing_rentals(db=db)
-    logger.info(f"Successfully ongoing rentals count: {ongoing_rentals_count}")
+    logger.debug("Successfully ongoing rentals count: %s", ongoing_rentals_count)
 
     resp = {"ongoing_rentals": ongoing_rentals_count}
     return resp
@@ -45,11 +78,35 @@ async def get_ongoing_rentals(db: AsyncSession = Depends(get_db_session)):
 @router.get("/avgresp", response_model=GetAverageResponseTimeResp)
 async def get_average_response_time():
 
-    logger.info("Getting average response time from prometheus")
+    logger.debug("Getting average response time from prometheus")
     avg_resp_time, total_hits = await MetricService.get_average_response_time()
-    logger.info(f"Successfully got average response time: {avg_resp_time} over {total_hits} hits")
+    logger.debug("Successfully got average response time: %s over %s hits", avg_resp_time, total_hits)
 
     resp = {"average_response_time_in_ms": avg_resp_time,
             "hit_count": total_hits
     }
     return resp
+
+@router.get("/latency", response_model=GetLatencyPercentilesResp)
+async def get_latency_percentiles(window: int = Query(1, description="Window length in minutes: 1, 5 or 15")):
+    """
+    Latency percentiles per route over a recent window, across all workers
+    """
+
+    # without a shared directory each worker only knows its own requests
+    if settings.WEB_CONCURRENCY > 1 and not rolling_latency.aggregated:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Latency percentiles need PROMETHEUS_MULTIPROC_DIR with several workers")
+
+    if window not in RollingLatency.WINDOWS_MINUTES:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                            detail=f"window must be one of {RollingLatency.WINDOWS_MINUTES}")
+
+    logger.debug("Getting latency percentiles over the last %s minutes", window)
+    routes = await MetricService.get_latency_percentiles(window_minutes=window)
+    logger.debug("Successfully got latency percentiles for %s routes", len(routes))
+
+    resp = {"window_minutes": window,
+            "routes": routes
+    }
+    return resp
@@ -1,8 +1,23 @@
 #!/bin/sh
 set -e
 
-# run migrations
-alembic -c /app/alembic.ini upgrade head
+# run migrations, skipped when the schema is already at head (see MIGRATION_MODE)
+python -m app.core.migrate
 
-# start the API
-uvicorn app.api.main:app --host 0.0.0.0 --port 8000
+# unless set explicitly, one worker per core as far as DB_MAX_CONNECTIONS covers them, a single
+# worker without a budget. Each worker gets a share of DB_MAX_CONNECTIONS, startup fails when it can't
+WEB_CONCURRENCY="${WEB_CONCURRENCY:-$(python -c 'import os; from app.core.config import settings; print(settings.default_workers(os.cpu_count()))')}"
+export WEB_CONCURRENCY
+
+# several workers share their prometheus metrics through files, start from a clean directory
+if [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# start the API. On SIGTERM /health/ready fails for SHUTDOWN_DRAIN_SECONDS while requests are still
+# served, then in flight requests get GRACEFUL_SHUTDOWN_SECONDS to finish before the lifespan drain
+exec uvicorn app.api.main:app --host 0.0.0.0 --port 8000 \
+    --workers "$WEB_CONCURRENCY" --loop uvloop --http httptools \
+    --timeout-graceful-shutdown "${GRACEFUL_SHUTDOWN_SECONDS:-20}"
@@ -1,83 +1,233 @@
 
 # Routing
-from fastapi import APIRouter, status, Query, Depends
+from fastapi import APIRouter, status, Query, Depends, Request, HTTPException
+from fastapi.responses import StreamingResponse, Response
 router = APIRouter(prefix="/cars", tags=["Cars"])
 
 # Models
 from uuid import UUID
-from ....models.validations.items import Car, CarUpdateReq, RentalStatusEnum
-from ....models.validations.responses import GetAllCarsResponse
-from typing import Optional
+from ....models.validations.items import Car, CarUpdateReq, RentalStatusEnum, BulkCarStatusReq
+from ....models.validations.responses import GetAllCarsResponse, GetAvailableCarsResponse, BulkAddCarsResponse, BulkCarStatusResponse, trusted_json_response
+from typing import Optional, AsyncIterator
+from datetime import datetime
+import json
+import csv
 
 # Functionality
 from ....services.car_service import CarService
 
+# Config
+from ....core.config import settings
+
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db_session
+from sqlalchemy.orm import sessionmaker
+from app.core.database import get_db_session, get_read_db_session, get_read_db_sessionmaker, mark_recent_write
 
 # Observability
 from ....core.logger import logger
 
 # GET ------------------
+# Get cars that can be booked for a time window
+@router.get("/available", response_model=GetAvailableCarsResponse, status_code=status.HTTP_200_OK)
+async def get_available_cars(window_start: datetime = Query(..., alias="from", description="Window start, inclusive"),
+                             window_end: datetime = Query(..., alias="to", description="Window end, exclusive"),
+                             company: Optional[str] = Query(None, description="Filter by car company"),
+                             year: Optional[int] = Query(None, description="Filter by car year"),
+                             limit: Optional[int] = Query(None, ge=1, le=1000, description="Max number of cars in the page"),
+                             after: Optional[UUID] = Query(None, description="Return cars with an id greater than this cursor"),
+                             db: AsyncSession = Depends(get_read_db_session, scope="function")):
+
+    if window_end <= window_start:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="to must be later than from")
+
+    logger.debug("Fetching Cars available between %s - %s", window_start, window_end)
+    cars = await CarService.get_available(db=db, window_start=window_start, window_end=window_end,
+                                          company=company, year=year, limit=limit, after=after)
+    resp = {"length": len(cars),
+            "window_start": window_start,
+            "window_end": window_end,
+            "cars": cars,
+            "next_cursor": cars[-1].id if limit and len(cars) == limit else None
+            }
+    logger.debug("Found %s available Cars", resp['length'])
+    if settings.FAST_READS:
+        return trusted_json_response(GetAvailableCarsResponse.model_construct(**resp))
+    return resp
+
 # Get a car by id
 @router.get("/{car_id}", response_model=Car, status_code=status.HTTP_200_OK)
 async def get_car_by_id(car_id: UUID,
-                        db: AsyncSession = Depends(get_db_session)):
+                        db: AsyncSession = Depends(get_read_db_session, scope="function")):
 
-    logger.info(f"Fetching Car with id: {car_id}")
+    logger.debug("Fetching Car with id: %s", car_id)
     car = await CarService.get_one_by_id(db=db, car_id=car_id)
-    logger.info(f"Found Car with id: {car_id}")
+    logger.debug("Found Car with id: %s", car_id)
+    if settings.FAST_READS:
+        return trusted_json_response(car)
     return car
 
 @router.get("/", response_model=GetAllCarsResponse, status_code=status.HTTP_200_OK)
 async def get_all_cars(status_filter: Optional[RentalStatusEnum] = Query(None, description="Filter by car rental status"),
-                       db: AsyncSession = Depends(get_db_session)):
+                       limit: Optional[int] = Query(None, ge=1, le=1000, description="Max number of cars in the page"),
+                       after: Optional[UUID] = Query(None, description="Return cars with an id greater than this cursor"),
+                       stream: bool = Query(False, description="Stream all matching cars as NDJSON"),
+                       db_json: bool = Query(False, description="Render the response json in the database"),
+                       db: AsyncSession = Depends(get_read_db_session, scope="function"),
+                       stream_sessions: sessionmaker = Depends(get_read_db_sessionmaker)):
 
-    # Query db for all cars with filter using the car Service
     status_filter_str = status_filter.value if status_filter else 'ANY'
-    logger.info(f"Fetching all Cars with status: {status_filter_str}")
-    cars = await CarService.get_all(db=db, status_filter=status_filter)
+
+    # Stream cars as newline delimited json straight from the cursor, on a session
+    # that lives as long as the response body instead of the whole request
+    if stream:
+        logger.debug("Streaming all Cars with status: %s", status_filter_str)
+
+        async def ndjson() -> AsyncIterator[str]:
+            async with stream_sessions() as stream_db:
+                async for car in CarService.stream_all(db=stream_db, status_filter=status_filter, after=after):
+                    yield car.model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    # Let postgres build the response document, pass it through as is
+    if db_json:
+        logger.debug("Fetching all Cars with status: %s as json", status_filter_str)
+        content = await CarService.get_all_json(db=db, status_filter=status_filter, limit=limit, after=after)
+        return Response(content=content, media_type="application/json")
+
+    # Query db for all cars with filter using the car Service
+    logger.debug("Fetching all Cars with status: %s", status_filter_str)
+    cars = await CarService.get_all(db=db, status_filter=status_filter, limit=limit, after=after)
     resp = {"length": len(cars),
             "filter": status_filter_str,
-            "cars":cars
+            "cars": cars,
+            "next_cursor": cars[-1].id if limit and len(cars) == limit else None
             }
-    logger.info(f"Found {resp['length']} Cars with Status: {status_filter.value if status_filter else 'ANY'}")
+    logger.debug("Found %s Cars with Status: %s", resp['length'], status_filter_str)
+    if settings.FAST_READS:
+        return trusted_json_response(GetAllCarsResponse.model_construct(**{**resp, "filter": status_filter or "ANY"}))
     return resp
 
 # POST ------------------
 # Add a new car
-@router.post("/", response_model=Car, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=Car, status_code=status.HTTP_201_CREATED, dependencies=[Depends(mark_recent_write)])
 async def add_car(car: Car,
-                  db: AsyncSession = Depends(get_db_session)):
+                  db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info(f"Adding Car: {str(car)}")
+    logger.debug("Adding Car: %s", car)
     new_car = await CarService.add_one(db=db, car=car)
-    logger.info(f"Successfully added Car: {str(car)}")
+    logger.debug("Successfully added Car: %s", car)
     return new_car
 
 
+# Bulk add cars from a json array, ndjson or csv body
+@router.post("/bulk", response_model=BulkAddCarsResponse, status_code=status.HTTP_200_OK, dependencies=[Depends(mark_recent_write)])
+async def bulk_add_cars(request: Request,
+                        db: AsyncSession = Depends(get_db_session, scope="function")):
+
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    logger.debug("Bulk adding Cars from %s body", content_type)
+    results = await CarService.add_many(db=db, records=_iter_records(request, content_type))
+    created = sum(1 for r in results if r.status == "created")
+    resp = {"total": len(results),
+            "created": created,
+            "rejected": len(results) - created,
+            "results": results
+            }
+    logger.debug("Bulk added %s of %s Cars", created, len(results))
+    return resp
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """
+    Splits the request body stream into lines without buffering the whole body.
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode()
+    if buffer:
+        yield buffer.decode()
+
+async def _iter_records(request: Request, content_type: str) -> AsyncIterator[dict]:
+
+    # Json array - a single document, has to be read whole
+    if content_type == "application/json":
+        try:
+            records = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid json")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a json array of cars")
+        for record in records:
+            yield record
+
+    # Ndjson - one car per line
+    elif content_type == "application/x-ndjson":
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield line  # not an object, reported as an invalid row
+
+    # Csv - flat columns id,company,name,year,status with a header row
+    elif content_type == "text/csv":
+        lines = _iter_lines(request)
+        header = next(csv.reader([await anext(lines, "")]))
+        async for line in lines:
+            if not line.strip():
+                continue
+            row = dict(zip(header, next(csv.reader([line]))))
+            yield {"id": row.get("id") or None,
+                   "model": {"company": row.get("company"), "name": row.get("name"), "year": row.get("year")},
+                   "status": {"status": row.get("status")}
+                   }
+
+    else:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Unsupported content type: {content_type}")
+
+
 # PATCH ----------------
+# Move many cars to a status at once, cars in use are left alone
+@router.patch("/bulk/status", response_model=BulkCarStatusResponse, status_code=status.HTTP_200_OK, dependencies=[Depends(mark_recent_write)])
+async def bulk_update_car_status(req: BulkCarStatusReq,
+                                 db: AsyncSession = Depends(get_db_session, scope="function")):
+
+    logger.debug("Setting Cars to status: %s", req.status.value)
+    updated, skipped, not_found = await CarService.set_status_many(db=db, req=req)
+    resp = {"status": req.status,
+            "updated": updated,
+            "skipped_in_use": skipped,
+            "not_found": not_found
+            }
+    logger.debug("Set %s Cars to status: %s", len(updated), req.status.value)
+    return resp
+
 # Update existing car based on id
-@router.patch("/{car_id}", response_model=Car, status_code=status.HTTP_200_OK)
+@router.patch("/{car_id}", response_model=Car, status_code=status.HTTP_200_OK, dependencies=[Depends(mark_recent_write)])
 async def update_car_by_id(car_id: UUID,
                            update_req: CarUpdateReq,
-                           db: AsyncSession = Depends(get_db_session)):
+                           db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info(f"Updating Car with id: {car_id} with request: {str(update_req)}")
+    logger.debug("Updating Car with id: %s with request: %s", car_id, update_req)
     patched_car = await CarService.update_one_by_id(db=db, car_id=car_id, update_req=update_req)
-    logger.info(f"Successfully Updated")
+    logger.debug("Successfully Updated")
     return patched_car
 
 
 # DELETE --------------
 # Delete existing car
-@router.delete("/{car_id}", response_model=None, status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{car_id}", response_model=None, status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(mark_recent_write)])
 async def delete_car_by_id(car_id: UUID,
-                           db: AsyncSession = Depends(get_db_session)):
+                           db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info(f"Deleting Car with id: {car_id}")
+    logger.debug("Deleting Car with id: %s", car_id)
     await CarService.delete_one_by_id(db=db, car_id=car_id)
-    logger.info(f"Successfully deleted Car with id: {car_id}")
+    logger.debug("Successfully deleted Car with id: %s", car_id)
     return None
 
@@ -1,6 +1,7 @@
 
 # Routing
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Query, Depends, HTTPException
+from fastapi.responses import Response
 router = APIRouter(prefix="/rentals", tags=["Rentals"])
 
 # Functionality
@@ -8,58 +9,122 @@ from app.services.rental_service import RentalService
 
 # Models
 from uuid import UUID
-from app.models.validations.items import Rental, RentalUpdateReq
-from app.models.validations.responses import GetAllRentalsResponse
+from datetime import datetime
+from typing import Optional
+from app.models.validations.items import Rental, RentalUpdateReq, RentalBatchReq
+from app.models.validations.responses import GetAllRentalsResponse, BatchRentalsResponse, trusted_json_response
+
+# Config
+from app.core.config import settings
 
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db_session
+from app.core.database import get_db_session, get_read_db_session, mark_recent_write
 
 # Observability
 from ....core.logger import logger
 
 # GET ------------------
+# Get rentals overlapping a time window
+@router.get("/overlapping", response_model=GetAllRentalsResponse, status_code=status.HTTP_200_OK)
+async def get_overlapping_rentals(window_start: datetime = Query(..., alias="from", description="Window start, inclusive"),
+                                  window_end: datetime = Query(..., alias="to", description="Window end, exclusive"),
+                                  limit: Optional[int] = Query(None, ge=1, le=1000, description="Max number of rentals in the page"),
+                                  after: Optional[UUID] = Query(None, description="Return rentals with an id greater than this cursor"),
+                                  db: AsyncSession = Depends(get_read_db_session, scope="function")):
+
+    if window_end <= window_start:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail="to must be later than from")
+
+    logger.debug("Fetching Rentals overlapping %s - %s", window_start, window_end)
+    rentals = await RentalService.get_overlapping(db=db, window_start=window_start, window_end=window_end,
+                                                  limit=limit, after=after)
+    resp = {"length": len(rentals),
+            "rentals": rentals,
+            "next_cursor": rentals[-1].id if limit and len(rentals) == limit else None
+            }
+    logger.debug("Found %s", resp['length'])
+    if settings.FAST_READS:
+        return trusted_json_response(GetAllRentalsResponse.model_construct(**resp))
+    return resp
+
 # Get a rental by id
 @router.get("/{rental_id}", response_model=Rental, status_code=status.HTTP_200_OK)
 async def get_rental_by_id(rental_id: UUID,
-                           db: AsyncSession = Depends(get_db_session)):
+                           db: AsyncSession = Depends(get_read_db_session, scope="function")):
 
-    logger.info(f"Fetching Rental with id: {rental_id}")
+    logger.debug("Fetching Rental with id: %s", rental_id)
     rental = await RentalService.get_one_by_id(db=db, rental_id=rental_id)
-    logger.info(f"Found Rental with id: {rental_id}")
+    logger.debug("Found Rental with id: %s", rental_id)
+    if settings.FAST_READS:
+        return trusted_json_response(rental)
     return rental
 
 @router.get("/", response_model=GetAllRentalsResponse, status_code=status.HTTP_200_OK)
-async def get_all_rentals(db: AsyncSession = Depends(get_db_session)):
+async def get_all_rentals(car_id: Optional[UUID] = Query(None, description="Filter by rented car"),
+                          customer_name: Optional[str] = Query(None, description="Filter by customer name"),
+                          start_from: Optional[datetime] = Query(None, description="Rentals starting at or after"),
+                          start_to: Optional[datetime] = Query(None, description="Rentals starting before"),
+                          end_from: Optional[datetime] = Query(None, description="Rentals ending at or after"),
+                          end_to: Optional[datetime] = Query(None, description="Rentals ending before"),
+                          limit: Optional[int] = Query(None, ge=1, le=1000, description="Max number of rentals in the page"),
+                          after: Optional[UUID] = Query(None, description="Return rentals with an id greater than this cursor"),
+                          db_json: bool = Query(False, description="Render the response json in the database"),
+                          db: AsyncSession = Depends(get_read_db_session, scope="function")):
+
+    # Let postgres build the response document, pass it through as is
+    if db_json:
+        logger.debug("Fetching all Rentals as json")
+        content = await RentalService.get_all_json(db=db, car_id=car_id, customer_name=customer_name,
+                                                   start_from=start_from, start_to=start_to,
+                                                   end_from=end_from, end_to=end_to,
+                                                   limit=limit, after=after)
+        return Response(content=content, media_type="application/json")
 
-    logger.info(f"Fetching all Rentals")
-    rentals = await RentalService.get_all(db=db)
+    logger.debug("Fetching all Rentals")
+    rentals = await RentalService.get_all(db=db, car_id=car_id, customer_name=customer_name,
+                                          start_from=start_from, start_to=start_to,
+                                          end_from=end_from, end_to=end_to,
+                                          limit=limit, after=after)
     resp = {"length": len(rentals),
-            "rentals": rentals
+            "rentals": rentals,
+            "next_cursor": rentals[-1].id if limit and len(rentals) == limit else None
             }
-    logger.info(f"Found {resp['length']}")
+    logger.debug("Found %s", resp['length'])
+    if settings.FAST_READS:
+        return trusted_json_response(GetAllRentalsResponse.model_construct(**resp))
     return resp
 
 
 # POST ------------------
 # Add a new rental
-@router.post("/", response_model=Rental, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=Rental, status_code=status.HTTP_201_CREATED, dependencies=[Depends(mark_recent_write)])
 async def start_rental(rental: Rental,
-                       db: AsyncSession = Depends(get_db_session)):
+                       db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info(f"Adding Rental: {str(rental)}")
+    logger.debug("Adding Rental: %s", rental)
     rental = await RentalService.add_one(db=db, rental=rental)
-    logger.info(f"Successfully added Rental: {str(rental)}")
+    logger.debug("Successfully added Rental: %s", rental)
     return rental
 
+# Add several rentals in one transaction
+@router.post("/batch", response_model=BatchRentalsResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(mark_recent_write)])
+async def start_rentals_batch(batch: RentalBatchReq,
+                              db: AsyncSession = Depends(get_db_session, scope="function")):
+
+    logger.debug("Adding batch of %s Rentals in %s mode", len(batch.rentals), batch.mode)
+    created, failed = await RentalService.add_many(db=db, rentals=batch.rentals, atomic=batch.mode == "atomic")
+    logger.debug("Successfully added %s Rentals, %s failed", len(created), len(failed))
+    return {"created": created, "failed": failed}
+
 # DELETE --------------
 # Delete rental
-@router.delete("/{rental_id}", response_model=None, status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{rental_id}", response_model=None, status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(mark_recent_write)])
 async def delete_rental_by_id(rental_id: UUID,
-                              db: AsyncSession = Depends(get_db_session)):
+                              db: AsyncSession = Depends(get_db_session, scope="function")):
 
-    logger.info(f"Deleting Rental with id: {rental_id}")
+    logger.debug("Deleting Rental with id: %s", rental_id)
     await RentalService.delete_one_by_id(db=db, rental_id=rental_id)
-    logger.info(f"Successfully Deleted Rental with id: {rental_id}")
+    logger.debug("Successfully Deleted Rental with id: %s", rental_id)
     return None
 
@@ -0,0 +1,149 @@
+
+# Functionality
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+
+# Types
+from typing import Any, Hashable, Optional, Tuple
+from uuid import UUID
+
+# Database
+import asyncpg
+
+# Config
+from .config import settings
+
+# Observability
+from prometheus_client import Counter
+from .logger import logger
+
+CACHE_HITS = Counter("cache_hits", "Cache lookups served from memory", ["cache"])
+CACHE_MISSES = Counter("cache_misses", "Cache lookups that fell through to the database", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions", "Cache entries dropped before being invalidated", ["cache", "reason"])
+
+# Postgres channel the cars table triggers notify on
+CAR_CACHE_CHANNEL = "car_cache_invalidate"
+
+
+class LRUTTLCache:
+    """
+    In-process LRU cache whose entries also expire after `ttl` seconds.
+
+    `generation()` returns a token to take before reading from the database,
+    `put()` ignores the value if any invalidation happened since, so a slow read
+    can't write back a value that a concurrent write already replaced.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_MISSES.labels(self.name).inc()
+            return None
+
+        expires_at, value = entry
+        if expires_at < monotonic():
+            del self._entries[key]
+            CACHE_EVICTIONS.labels(self.name, "expired").inc()
+            CACHE_MISSES.labels(self.name).inc()
+            return None
+
+        self._entries.move_to_end(key)
+        CACHE_HITS.labels(self.name).inc()
+        return value
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self._generation:
+            return
+
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.labels(self.name, "size").inc()
+
+    def invalidate(self, key: Hashable) -> None:
+        self._generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+
+class CacheInvalidationListener:
+    """
+    Keeps a dedicated connection LISTENing on a Postgres channel and invalidates
+    the cache entry named by each notification payload, so every worker drops
+    entries another worker (or any other writer) changed.
+    """
+
+    def __init__(self, cache: LRUTTLCache, channel: str, retry_interval: float = 5.0):
+        self.cache = cache
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, database_url: str) -> None:
+        dsn = database_url.replace("postgresql+asyncpg", "postgresql")
+        self._task = asyncio.create_task(self._run(dsn))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self.cache.invalidate(UUID(payload))
+        except ValueError:
+            logger.warning("Ignoring malformed %s notification: %s", channel, payload)
+
+    async def _run(self, dsn: str) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notify)
+
+                # Notifications sent while we weren't listening are lost
+                self.cache.clear()
+                logger.info("Listening for %s notifications", self.channel)
+                await closed.wait()
+                logger.warning("Lost %s listener connection, reconnecting", self.channel)
+
+            except asyncio.CancelledError:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+                raise
+
+            except Exception as e:
+                logger.warning("Cannot listen for %s notifications: %s", self.channel, e)
+
+            # Entries may go stale while disconnected, stop serving them
+            self.cache.clear()
+            await asyncio.sleep(self.retry_interval)
+
+
+car_cache = LRUTTLCache(
+    name="cars",
+    max_size=settings.CAR_CACHE_MAX_SIZE,
+    ttl=settings.CAR_CACHE_TTL_SECONDS
+)
+car_cache_listener = CacheInvalidationListener(cache=car_cache, channel=CAR_CACHE_CHANNEL)
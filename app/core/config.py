@@ -1,6 +1,108 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
+from typing import Dict, List, Literal, Optional, Tuple
 
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # Database engine
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Boot time migrations, see app.core.migrate - "auto", "check" or "off"
+    MIGRATION_MODE: Literal["auto", "check", "off"] = "auto"
+
+    # Pool connections opened, and warmed with the hot queries, before the app reports ready
+    DB_WARMUP_CONNECTIONS: int = 2
+
+    # Read replica - GET routes read from it, a client that just wrote reads from the primary for this long
+    DATABASE_READ_URL: Optional[str] = None
+    DB_READ_YOUR_WRITES_SECONDS: int = 5
+
+    # Serving - worker count, and the connection budget shared by all workers
+    WEB_CONCURRENCY: int = 1
+    DB_MAX_CONNECTIONS: Optional[int] = None
+
+    # On SIGTERM /health/ready fails right away, requests keep being served this long before shutdown starts
+    SHUTDOWN_DRAIN_SECONDS: float = 0.0
+
+    # Bulk ingestion
+    CAR_BULK_BATCH_SIZE: int = 1000
+
+    # Read path - build response models from plain rows without validation
+    FAST_READS: bool = False
+
+    # Request metrics
+    METRICS_LATENCY_BUCKETS_MS: List[float] = [1, 2.5, 5, 10, 25, 50, 75, 100, 250, 500, 1000, 2500, 5000, 10000]
+    METRICS_SIZE_BUCKETS_BYTES: List[float] = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+    METRICS_DB_GAUGE_MIN_INTERVAL_SECONDS: float = 15.0
+    FLEET_COUNTS_COMPACT_INTERVAL_SECONDS: float = 60.0
+
+    # Admission control - AIMD cap on in flight /v1 requests, see app.api.admission
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MIN_LIMIT: int = 2
+    ADMISSION_MAX_LIMIT: int = 500
+    ADMISSION_LATENCY_TARGET_MS: float = 500.0
+    ADMISSION_BACKOFF: float = 0.9
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Logging - sinks are any of "stdout" and "file", sample rates apply to successful request logs
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_SINKS: List[Literal["stdout", "file"]] = ["stdout", "file"]
+    LOG_DIR: str = "/containedapp/logs"
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    LOG_ROUTE_SAMPLE_RATES: Dict[str, float] = {}
+
+    # Car cache
+    CAR_CACHE_ENABLED: bool = True
+    CAR_CACHE_MAX_SIZE: int = 10_000
+    CAR_CACHE_TTL_SECONDS: float = 30.0
+
+    @property
+    def connections_per_worker(self) -> int:
+        """
+        Fewest connections a worker runs with: one pool connection, and its car cache listener's.
+        """
+        return 2 if self.CAR_CACHE_ENABLED else 1
+
+    def default_workers(self, cores: int) -> int:
+        """
+        Worker count when WEB_CONCURRENCY is not set: one per core as far as DB_MAX_CONNECTIONS
+        covers them, a single worker when there is no budget to split.
+        """
+        if not self.DB_MAX_CONNECTIONS:
+            return 1
+        return max(min(cores, self.DB_MAX_CONNECTIONS // self.connections_per_worker), 1)
+
+    @property
+    def worker_pool_limits(self) -> Tuple[int, int]:
+        """
+        Pool size and overflow for one worker, so all workers together stay within
+        DB_MAX_CONNECTIONS. Each worker's car cache listener holds one more connection.
+        """
+        if not self.DB_MAX_CONNECTIONS:
+            return self.DB_POOL_SIZE, self.DB_MAX_OVERFLOW
+
+        per_worker = self.DB_MAX_CONNECTIONS // max(self.WEB_CONCURRENCY, 1)
+        if per_worker < self.connections_per_worker:
+            raise ValueError(f"DB_MAX_CONNECTIONS={self.DB_MAX_CONNECTIONS} does not cover {self.WEB_CONCURRENCY} "
+                             f"workers with {self.connections_per_worker} connections each, lower WEB_CONCURRENCY")
+        if self.CAR_CACHE_ENABLED:
+            per_worker -= 1
+
+        pool_size = min(self.DB_POOL_SIZE, per_worker)
+        return pool_size, min(self.DB_MAX_OVERFLOW, per_worker - pool_size)
+
+    @model_validator(mode="after")
+    def _check_connection_budget(self) -> "Settings":
+        self.worker_pool_limits  # fail at startup, not on the first pool checkout
+        return self
+
+
 settings = Settings()
\ No newline at end of file
@@ -1,17 +1,90 @@
+from fastapi import Request, Response
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
+from ..core.pool_metrics import InstrumentedAsyncQueuePool, instrument_pool
+
+# Read consistency - clients that must see their own writes read from the primary
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+RECENT_WRITE_COOKIE = "drivenow_recent_write"
+
+
+def build_engine(database_url: str, label: str) -> AsyncEngine:
+    pool_size, max_overflow = settings.worker_pool_limits
+    engine = create_async_engine(
+        database_url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,  # asyncpg's own cache
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE  # sqlalchemy's adapter cache
+        }
+    )
+    instrument_pool(engine, label)
+    return engine
+
+
+# Create factories, reads share the primary unless a replica is configured
+engine: AsyncEngine = build_engine(settings.DATABASE_URL, "primary")
+read_engine: AsyncEngine = build_engine(settings.DATABASE_READ_URL, "replica") if settings.DATABASE_READ_URL else engine
 
-# Create factory
-engine: AsyncEngine = create_async_engine(settings.DATABASE_URL, echo=True)
 AsyncSessionLocal = sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
+AsyncReadSessionLocal = sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+def read_sessionmaker_for(request: Request) -> sessionmaker:
+    """
+    The replica, unless the client asked for primary reads or wrote recently.
+    """
+    if request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary":
+        return AsyncSessionLocal
+    if RECENT_WRITE_COOKIE in request.cookies:
+        return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+
+def is_replica_session(db: AsyncSession) -> bool:
+    """
+    Whether `db` reads from the replica, whose rows may predate the latest writes.
+    """
+    return read_engine is not engine and db.bind is read_engine
+
 
 # Dependency for FastAPI endpoints
+# The connection is only checked out on the first statement. Depend on it with scope="function"
+# so the commit and release happen when the endpoint returns, not after the response is sent.
 async def get_db_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         async with session.begin():  # opens transaction, commits on success, rolls back on exception
-            yield session
\ No newline at end of file
+            yield session
+
+# Dependency for read only endpoints, may lag the primary by the replication delay
+async def get_read_db_session(request: Request) -> AsyncSession:
+    async with read_sessionmaker_for(request)() as session:
+        async with session.begin():
+            yield session
+
+# Dependency for endpoints streaming their response, which read while sending and so
+# open their own session in the response body instead of holding one for the request
+def get_read_db_sessionmaker(request: Request) -> sessionmaker:
+    return read_sessionmaker_for(request)
+
+# Dependency for mutating endpoints, pins the client's reads to the primary for a while
+def mark_recent_write(response: Response) -> None:
+    if settings.DATABASE_READ_URL:
+        response.set_cookie(RECENT_WRITE_COOKIE, "1",
+                            max_age=settings.DB_READ_YOUR_WRITES_SECONDS,
+                            httponly=True, samesite="lax")
@@ -0,0 +1,212 @@
+
+# Functionality
+import glob
+import json
+import math
+import os
+from itertools import accumulate
+from time import time
+
+# Types
+from typing import Dict, List, Optional, Tuple
+
+
+class LogHistogram:
+    """
+    HDR-style histogram: values land in log-spaced buckets, so any quantile is
+    reported within `PRECISION` relative error, and the bucket count is bounded
+    by the value range, not by the number of observations.
+    """
+
+    MIN_VALUE = 0.01  # ms
+    PRECISION = 0.01
+    _LOG_BASE = math.log1p(PRECISION)
+
+    __slots__ = ("buckets", "count", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        index = int(math.log(max(value, self.MIN_VALUE) / self.MIN_VALUE) / self._LOG_BASE)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram") -> None:
+        self.merge_buckets(other.buckets, other.max)
+
+    def merge_buckets(self, buckets: Dict[int, int], max_value: float) -> None:
+        for index, count in buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+            self.count += count
+        self.max = max(self.max, max_value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # bucket midpoint, never above the exact max
+                value = self.MIN_VALUE * math.exp((index + 0.5) * self._LOG_BASE)
+                return min(value, self.max)
+        return self.max
+
+
+class RollingLatency:
+    """
+    Per route latency over a sliding time window.
+
+    Each route keeps a ring of `SLOT_SECONDS` wide histograms covering the largest
+    window, a slot is reset when the ring wraps around onto it. Windows are answered
+    by merging the slots they cover, so memory stays bounded per route.
+
+    With a `directory` (PROMETHEUS_MULTIPROC_DIR when several workers run) every worker
+    writes its rings to a file there every `FLUSH_SECONDS`, and snapshots merge the files
+    of the other workers in, so percentiles cover the whole server. File reads and writes
+    are left to the caller, to run off the event loop (see app.core.lifecycle).
+    """
+
+    SLOT_SECONDS = 10
+    WINDOWS_MINUTES = (1, 5, 15)
+    SLOT_COUNT = max(WINDOWS_MINUTES) * 60 // SLOT_SECONDS
+    FLUSH_SECONDS = 1.0
+
+    def __init__(self, directory: Optional[str] = None, worker: Optional[str] = None):
+        self.directory = directory
+        self._worker = worker
+        self._rings: Dict[Tuple[str, str], List[Tuple[int, LogHistogram]]] = {}
+
+    @property
+    def aggregated(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, worker: str) -> str:
+        return os.path.join(self.directory, f"latency_{worker}.json")
+
+    def _own_path(self) -> str:
+        # resolved on use, a worker forked after import gets its own file
+        return self._path(self._worker or str(os.getpid()))
+
+    def record(self, method: str, route: str, value: float, now: float | None = None) -> None:
+        slot_id = int((now or time()) // self.SLOT_SECONDS)
+        ring = self._rings.get((method, route))
+        if ring is None:
+            ring = self._rings[(method, route)] = [(-1, LogHistogram())] * self.SLOT_COUNT
+
+        position = slot_id % self.SLOT_COUNT
+        ring_slot_id, histogram = ring[position]
+        if ring_slot_id != slot_id:
+            histogram = LogHistogram()
+            ring[position] = (slot_id, histogram)
+        histogram.record(value)
+
+    def export(self, now: float | None = None) -> list:
+        """
+        References to this worker's slots within the largest window, for `write`. Runs on the
+        event loop: only the current slot is still recorded into, so only its buckets are copied.
+        """
+        current = int((now or time()) // self.SLOT_SECONDS)
+        oldest = current - self.SLOT_COUNT
+        return [(method, route, [(slot_id, histogram.max,
+                                  histogram.buckets.copy() if slot_id >= current else histogram.buckets)
+                                 for slot_id, histogram in ring if slot_id > oldest and histogram.count])
+                for (method, route), ring in list(self._rings.items())]
+
+    def write(self, rings: list) -> None:
+        """
+        Writes exported rings for the other workers to read, replacing the file atomically.
+        Each slot is [slot_id, max, bucket indexes as deltas from the previous one, counts].
+        """
+        encoded = []
+        for method, route, slots in rings:
+            encoded_slots = []
+            for slot_id, max_value, buckets in slots:
+                indexes = sorted(buckets)
+                deltas = [index - previous for previous, index in zip([0] + indexes, indexes)]
+                encoded_slots.append([slot_id, max_value, deltas, [buckets[index] for index in indexes]])
+            encoded.append([method, route, encoded_slots])
+
+        path = self._own_path()
+        with open(path + ".tmp", "w") as f:
+            f.write(json.dumps(encoded, separators=(",", ":")))
+        os.replace(path + ".tmp", path)
+
+    def flush(self) -> None:
+        self.write(self.export())
+
+    def discard(self) -> None:
+        """
+        Removes this worker's file, call on shutdown.
+        """
+        if self.directory is not None:
+            try:
+                os.remove(self._own_path())
+            except FileNotFoundError:
+                pass
+
+    def read_workers(self) -> list:
+        """
+        The other workers' rings as of their last flush, in the `export` format.
+        Files of dead workers age out of the windows.
+        """
+        if self.directory is None:
+            return []
+
+        rings = []
+        own = self._own_path()
+        for path in glob.glob(self._path("*")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    encoded = json.loads(f.read())
+            except (OSError, ValueError):
+                continue
+            for method, route, slots in encoded:
+                rings.append((method, route, [(slot_id, max_value, dict(zip(accumulate(deltas), counts)))
+                                              for slot_id, max_value, deltas, counts in slots]))
+        return rings
+
+    def snapshot(self, window_minutes: int, now: float | None = None, workers: list = ()) -> List[dict]:
+        """
+        Returns count, p50, p95, p99 and max for every route seen within the window,
+        merging in the other workers' rings from `read_workers`.
+        """
+        return self.percentiles(self.export(now) + list(workers), window_minutes, now)
+
+    @classmethod
+    def percentiles(cls, rings: list, window_minutes: int, now: float | None = None) -> List[dict]:
+        """
+        `snapshot` over exported rings, touches no live state so it may run in a thread.
+        """
+        current = int((now or time()) // cls.SLOT_SECONDS)
+        oldest = current - window_minutes * 60 // cls.SLOT_SECONDS
+
+        per_route: Dict[Tuple[str, str], LogHistogram] = {}
+        for method, route, slots in rings:
+            for slot_id, max_value, buckets in slots:
+                if oldest < slot_id <= current:
+                    per_route.setdefault((method, route), LogHistogram()).merge_buckets(buckets, max_value)
+
+        routes = []
+        for (method, route), merged in per_route.items():
+            routes.append({"route": route,
+                           "method": method,
+                           "count": merged.count,
+                           "p50": round(merged.quantile(0.50), 2),
+                           "p95": round(merged.quantile(0.95), 2),
+                           "p99": round(merged.quantile(0.99), 2),
+                           "max": round(merged.max, 2)
+                           })
+        return sorted(routes, key=lambda r: (r["route"], r["method"]))
+
+
+rolling_latency = RollingLatency(directory=os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
@@ -0,0 +1,177 @@
+
+# Functionality
+import asyncio
+import signal
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+# Types
+from typing import List
+from fastapi import FastAPI
+
+# Config
+from .config import settings
+
+# Database
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, AsyncConnection
+from .database import engine, read_engine, AsyncSessionLocal
+
+# Warm up
+from ..models.orm import CarTableSchema, CAR_ROW_COLUMNS
+from ..models.validations.items import Car, Rental
+from ..models.validations.responses import GetAllCarsResponse, GetAllRentalsResponse
+from ..services.car_service import CarService
+from ..services.rental_service import RentalService
+from ..services.MetricService import MetricService
+
+# Cache
+from .cache import car_cache_listener
+
+# Metrics
+from .metrics_registry import mark_worker_dead
+from .latency_window import rolling_latency
+
+# Observability
+from .logger import logger, stop_listener
+
+
+async def _warm_engine(db_engine: AsyncEngine, connections: int) -> None:
+    """
+    Opens up to `connections` pool connections at once and runs the hot queries on each,
+    so first requests find connections open and their prepared statements cached.
+    """
+    count = min(connections, db_engine.sync_engine.pool.size())
+    opened: List[AsyncConnection] = [db_engine.connect() for _ in range(count)]
+    try:
+        await asyncio.gather(*(connection.start() for connection in opened))
+        for connection in opened:
+            async with AsyncSession(bind=connection) as session:
+                await session.execute(select(*CAR_ROW_COLUMNS).where(CarTableSchema.id == uuid4()))
+                await session.execute(CarService._list_query().limit(1))
+                await session.execute(RentalService._list_query().limit(1))
+                await MetricService.get_fleet_status_counts(db=session)
+                await session.rollback()
+    finally:
+        await asyncio.gather(*(connection.close() for connection in opened))
+
+
+def _warm_models(app: FastAPI) -> None:
+    """
+    Runs validation and serialization once for the models on the hot paths,
+    and builds the OpenAPI schema that is otherwise generated on the first /docs hit.
+    """
+    now = datetime.now(timezone.utc)
+    car = Car.model_validate({"id": uuid4(),
+                              "model": {"company": "Warmup", "name": "Warmup", "year": now.year},
+                              "status": {"status": "available"}})
+    rental = Rental.model_validate({"id": uuid4(), "car_id": car.id, "customer_name": "Warmup",
+                                    "start_date": now, "end_date": now + timedelta(days=1)})
+    GetAllCarsResponse(length=1, filter="ANY", cars=[car]).model_dump_json()
+    GetAllRentalsResponse(length=1, rentals=[rental]).model_dump_json()
+    app.openapi()
+
+
+async def _compact_fleet_status_counts(interval_seconds: float) -> None:
+    """
+    Folds the fleet status deltas the cars triggers append, every `interval_seconds`.
+    Workers race for an advisory lock, one of them compacts per round.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with AsyncSessionLocal() as session:
+                folded = await MetricService.compact_fleet_status_counts(db=session)
+            logger.debug("Compacted %s fleet status deltas", folded)
+        except Exception as e:
+            logger.warning("Fleet status compaction failed: %s", e)
+
+
+async def _flush_latency_window(interval_seconds: float) -> None:
+    """
+    Writes this worker's rolling latency for the other workers every `interval_seconds`,
+    the write runs in a thread so requests are not held up by it.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(rolling_latency.write, rolling_latency.export())
+        except Exception as e:
+            logger.warning("Writing the latency window failed: %s", e)
+
+
+def _drain_on_sigterm(app: FastAPI, drain_seconds: float) -> None:
+    """
+    Wraps the server's SIGTERM handler: the first SIGTERM only flips readiness and hands over
+    to the server `drain_seconds` later, so load balancers stop routing here while requests
+    are still served. A second SIGTERM shuts down right away.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous) or threading.current_thread() is not threading.main_thread():
+        return  # not under a server that handles SIGTERM
+    loop = asyncio.get_running_loop()
+    draining = False
+
+    def handle_sigterm(signum, frame):
+        nonlocal draining
+        if draining:
+            previous(signum, frame)
+            return
+
+        draining = True
+        app.state.ready = False
+        logger.info("SIGTERM received, reporting not ready for %s s before shutting down", drain_seconds)
+        loop.call_soon_threadsafe(loop.call_later, drain_seconds, previous, signum, None)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    # Startup
+    app.state.ready = False
+    if settings.CAR_CACHE_ENABLED:
+        car_cache_listener.start(settings.DATABASE_URL)
+
+    # Warm up is best effort, a database that is down is reported by /health/db
+    _warm_models(app)
+    try:
+        await _warm_engine(engine, settings.DB_WARMUP_CONNECTIONS)
+        if read_engine is not engine:
+            await _warm_engine(read_engine, settings.DB_WARMUP_CONNECTIONS)
+    except Exception as e:
+        logger.warning("Database warm up failed: %s", e)
+
+    compaction = asyncio.create_task(
+        _compact_fleet_status_counts(settings.FLEET_COUNTS_COMPACT_INTERVAL_SECONDS)
+    )
+
+    latency_flush = None
+    if rolling_latency.aggregated:
+        latency_flush = asyncio.create_task(_flush_latency_window(rolling_latency.FLUSH_SECONDS))
+
+    _drain_on_sigterm(app, settings.SHUTDOWN_DRAIN_SECONDS)
+    app.state.ready = True
+    logger.info("DriveNow started")
+
+    yield
+
+    # Shutdown - readiness already failed on SIGTERM, the server has stopped accepting
+    # requests and drained the in flight ones
+    app.state.ready = False
+    # background tasks finish before the engines they may hold connections of are disposed
+    background = [task for task in (compaction, latency_flush) if task is not None]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await car_cache_listener.stop()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+    mark_worker_dead()
+    rolling_latency.discard()
+    logger.info("DriveNow stopped")
+    stop_listener()
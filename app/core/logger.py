@@ -2,13 +2,33 @@ import logging
 from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from queue import Queue
 import sys
-from datetime import datetime
+import json
+import random
+from datetime import datetime, timezone
 import os
 
-# Timestamp
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-log_file = f"/containedapp/logs/drivenow_{timestamp}.log"
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
+# Config
+from .config import settings
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Structured fields passed as `extra={"fields": {...}}`
+    are merged into the object, serialization happens on the listener thread.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
 
 # Queue to write in an atomic fashion
 log_queue = Queue(-1)
@@ -18,20 +38,61 @@ queue_handler = QueueHandler(log_queue)
 
 # Root logger
 logger = logging.getLogger("myapp")
-logger.setLevel(logging.INFO)
+logger.setLevel(settings.LOG_LEVEL.upper())
 logger.addHandler(queue_handler)
 logger.propagate = False
 
+# One structured line per API request, see `should_log_request`
+request_logger = logger.getChild("requests")
+
 # Format logs
-formatter = logging.Formatter(
-    fmt="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(formatter)
-
-file_handler = RotatingFileHandler(log_file, maxBytes=10_000_000, backupCount=5)
-file_handler.setFormatter(formatter)
-
-listener = QueueListener(log_queue, console_handler, file_handler)
-listener.start()
\ No newline at end of file
+if settings.LOG_FORMAT == "json":
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        fmt="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+# Sinks, the log file is only created when enabled
+handlers = []
+if "stdout" in settings.LOG_SINKS:
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
+
+if "file" in settings.LOG_SINKS:
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_file = os.path.join(settings.LOG_DIR, f"drivenow_{timestamp}.log")
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=10_000_000, backupCount=5)
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+
+listener = QueueListener(log_queue, *handlers)
+listener.start()
+
+
+def should_log_request(route: str, status_code: int) -> bool:
+    """
+    Errors are always logged, successes are sampled at the route's rate from
+    LOG_ROUTE_SAMPLE_RATES, or LOG_SUCCESS_SAMPLE_RATE for other routes.
+    """
+    if not request_logger.isEnabledFor(logging.INFO):
+        return False
+    if status_code >= 400:
+        return True
+
+    rate = settings.LOG_ROUTE_SAMPLE_RATES.get(route, settings.LOG_SUCCESS_SAMPLE_RATE)
+    return rate >= 1.0 or random.random() < rate
+
+
+def stop_listener() -> None:
+    """
+    Writes out the queued records and stops the listener thread, call last on shutdown.
+    """
+    if listener._thread is not None:
+        listener.stop()
+    for handler in handlers:
+        handler.close()
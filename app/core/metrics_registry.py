@@ -0,0 +1,48 @@
+
+# Functionality
+import os
+
+# Types
+from typing import List
+
+# Observability
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+from prometheus_client.registry import Collector
+
+# Custom collectors, also added to every multiprocess registry
+_collectors: List[Collector] = []
+
+
+def is_multiprocess() -> bool:
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def register_collector(collector: Collector) -> None:
+    """
+    Registers a custom collector on the default registry and on the aggregated
+    multiprocess ones, whose values are not written to PROMETHEUS_MULTIPROC_DIR.
+    """
+    REGISTRY.register(collector)
+    _collectors.append(collector)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to read metrics from. With several workers every process writes its
+    samples to PROMETHEUS_MULTIPROC_DIR, and they are aggregated here on read.
+    """
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _collectors:
+            registry.register(collector)
+        return registry
+    return REGISTRY
+
+
+def mark_worker_dead() -> None:
+    """
+    Drops this worker's live gauges from the aggregation, call on shutdown.
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,119 @@
+"""
+Boot time migrations, run before the API starts: `python -m app.core.migrate`.
+
+Reads the schema revision with one query and returns right away when it is already
+at head. Otherwise the upgrade runs under a Postgres advisory lock, so when many
+replicas boot at once only one of them migrates and the others wait, then find the
+schema at head.
+
+MIGRATION_MODE picks the behaviour:
+    auto  - upgrade to head when behind (default)
+    check - fail when behind, for replicas that must not migrate
+    off   - do nothing
+"""
+
+# Functionality
+import os
+import sys
+import logging
+from time import perf_counter
+
+# Types
+from typing import Set
+
+# Database
+import psycopg2
+from psycopg2 import errors
+
+# Migrations
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+# Config
+from .config import settings
+
+# Observability - the app logger is not imported, it starts its sinks on import
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+logger = logging.getLogger("drivenow.migrate")
+logger.setLevel(logging.INFO)  # alembic.ini turns the root logger down to WARNING
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
+
+# Arbitrary application wide key, every replica must use the same one
+MIGRATION_LOCK_ID = 4_418_173_012
+
+
+def head_revisions(config: Config) -> Set[str]:
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def current_revisions(connection) -> Set[str]:
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SELECT version_num FROM alembic_version")
+        except errors.UndefinedTable:  # never migrated
+            connection.rollback()
+            return set()
+        revisions = {row[0] for row in cursor.fetchall()}
+    connection.rollback()  # don't sit idle in transaction while waiting on the lock
+    return revisions
+
+
+def migrate(database_url: str, mode: str) -> bool:
+    """
+    Brings the schema to head according to `mode`, returns whether an upgrade ran.
+    """
+    if mode == "off":
+        logger.info("MIGRATION_MODE is off, skipping migrations")
+        return False
+
+    # env.py migrates the database passed here, not DATABASE_URL, so the check, the lock
+    # and the upgrade all hit the same database
+    config = Config(ALEMBIC_INI)
+    config.attributes["database_url"] = database_url
+    heads = head_revisions(config)
+    dsn = database_url.replace("postgresql+asyncpg", "postgresql").replace("postgresql+psycopg2", "postgresql")
+
+    connection = psycopg2.connect(dsn)
+    try:
+        if current_revisions(connection) == heads:
+            logger.info("Schema is at head %s, skipping migrations", ", ".join(sorted(heads)))
+            return False
+
+        if mode == "check":
+            raise RuntimeError(f"Schema is not at head {', '.join(sorted(heads))} and MIGRATION_MODE is check")
+
+        # One replica migrates, the rest wait here and then find the schema at head
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            if current_revisions(connection) == heads:
+                logger.info("Schema was migrated by another replica, skipping migrations")
+                return False
+
+            logger.info("Upgrading schema to head %s", ", ".join(sorted(heads)))
+            command.upgrade(config, "head")
+            return True
+
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        connection.close()
+
+
+def main() -> int:
+    start = perf_counter()
+    try:
+        migrate(settings.DATABASE_URL, settings.MIGRATION_MODE)
+    except Exception:
+        logger.exception("Migrations failed")
+        return 1
+    logger.info("Migration check done in %.0f ms", (perf_counter() - start) * 1000)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
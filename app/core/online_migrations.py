@@ -0,0 +1,125 @@
+"""
+Helpers for schema changes on large tables that must not block writes, for use in
+alembic revisions:
+
+    from app.core.online_migrations import create_index_concurrently, backfill
+
+    def upgrade() -> None:
+        op.add_column("rentals", sa.Column("channel", sa.String(), nullable=True))
+        backfill("rentals", set_clause="channel = 'web'", where="channel IS NULL")
+        create_index_concurrently("ix_rentals_channel", "rentals", ["channel"])
+
+Both run outside the revision's transaction, so a revision using them should do
+nothing else that must be atomic with them.
+"""
+
+# Functionality
+import logging
+from contextlib import contextmanager
+from time import monotonic, sleep
+
+# Types
+from typing import Iterator, List, Optional, Union
+
+# Migrations
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger("alembic.online")
+
+
+def _quote(name: str) -> str:
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+@contextmanager
+def _without_lock_timeout() -> Iterator[None]:
+    """
+    Lifts the migration lock_timeout policy (see env.py) for a concurrent index build or drop.
+
+    Those wait for every transaction that may write the table to finish, a lock_timeout
+    would fail them with an INVALID index left behind. Their table lock does not conflict
+    with reads and writes, so waiting holds up no live traffic.
+    """
+    connection = op.get_bind()
+    policy = connection.exec_driver_sql("SHOW lock_timeout").scalar()
+    connection.exec_driver_sql("SET lock_timeout = 0")
+    try:
+        yield
+    finally:
+        connection.exec_driver_sql(f"SET lock_timeout = '{policy}'")
+
+
+def create_index_concurrently(index_name: str, table_name: str,
+                              columns: List[Union[str, sa.TextClause]], **kw) -> None:
+    """
+    CREATE INDEX CONCURRENTLY, which only blocks writes for short lock acquisitions.
+
+    An interrupted concurrent build leaves an INVALID index behind, it is dropped
+    first so the migration can simply be rerun.
+    """
+    with op.get_context().autocommit_block(), _without_lock_timeout():
+        invalid = op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": index_name}).first()
+        if invalid:
+            logger.warning("Dropping invalid index %s left by an interrupted build", index_name)
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {_quote(index_name)}")
+
+        op.create_index(index_name, table_name, columns, postgresql_concurrently=True,
+                        if_not_exists=True, **kw)
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    with op.get_context().autocommit_block(), _without_lock_timeout():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+
+
+def backfill(table_name: str, set_clause: str, where: str,
+             batch_size: int = 1000, pause_seconds: float = 0.05,
+             key: str = "id", log_every_seconds: float = 10.0) -> int:
+    """
+    Runs `UPDATE table SET set_clause WHERE where` in key ordered batches, each in its own
+    transaction, pausing `pause_seconds` between batches to leave room for live traffic.
+
+    `where` must select the rows still to do (e.g. "col IS NULL") and stop matching a row
+    once it is updated, that is what makes an interrupted backfill resume where it stopped.
+    Returns the number of rows updated.
+    """
+    table, key_column = _quote(table_name), _quote(key)
+    batch = sa.text(
+        f"UPDATE {table} SET {set_clause} WHERE {key_column} IN ("
+        f"SELECT {key_column} FROM {table} "
+        f"WHERE ({where}) AND (CAST(:last_key AS text) IS NULL OR {key_column} > :last_key) "
+        f"ORDER BY {key_column} LIMIT :batch_size FOR UPDATE"
+        f") RETURNING {key_column}"
+    )
+
+    done = 0
+    last_key: Optional[object] = None
+    started = last_logged = monotonic()
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        estimate = connection.execute(
+            sa.text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": table_name}
+        ).scalar()
+
+        while True:
+            # autocommit, every batch commits and releases its row locks on its own
+            keys = connection.execute(batch, {"last_key": last_key, "batch_size": batch_size}).scalars().all()
+            if not keys:
+                break
+
+            done += len(keys)
+            last_key = max(keys)
+            if monotonic() - last_logged >= log_every_seconds:
+                logger.info("Backfill %s: %s rows updated (table has ~%s rows), %.0f rows/s",
+                            table_name, done, estimate, done / (monotonic() - started))
+                last_logged = monotonic()
+            if pause_seconds:
+                sleep(pause_seconds)
+
+    logger.info("Backfill %s done: %s rows updated in %.1f s", table_name, done, monotonic() - started)
+    return done
@@ -0,0 +1,86 @@
+
+# Functionality
+from time import perf_counter
+
+# Database
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Observability
+from prometheus_client import Gauge, Histogram
+
+# livesum - summed over the live workers when running multiprocess
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured number of persistent pool connections", ["pool"],
+                     multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Pool connections currently checked out", ["pool"],
+                            multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", ["pool"],
+                         multiprocess_mode="livesum")
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_ms",
+    "Time spent obtaining a pool connection in ms",
+    ["pool"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+)
+DB_POOL_HOLD = Histogram(
+    "db_pool_hold_ms",
+    "Time a connection stays checked out of the pool in ms",
+    ["pool"],
+    buckets=(0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records how long each checkout waited,
+    including time spent opening a new connection when the pool had none idle.
+    """
+
+    metrics_label = "primary"
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.labels(self.metrics_label).observe((perf_counter() - start) * 1000)
+
+
+def instrument_pool(engine: AsyncEngine, label: str = "primary") -> None:
+    """
+    Keeps the pool gauges current through SQLAlchemy pool events.
+    """
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        pool.metrics_label = label
+
+    # Counted from the events themselves, the pool's own counters lag behind them under load
+    open_connections = 0
+
+    def on_connect(*_) -> None:
+        nonlocal open_connections
+        open_connections += 1
+        DB_POOL_OVERFLOW.labels(label).set(max(open_connections - pool.size(), 0))
+
+    def on_close(*_) -> None:
+        nonlocal open_connections
+        open_connections -= 1
+        DB_POOL_OVERFLOW.labels(label).set(max(open_connections - pool.size(), 0))
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = perf_counter()
+        DB_POOL_CHECKED_OUT.labels(label).inc()
+
+    def on_checkin(dbapi_connection, connection_record) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            DB_POOL_HOLD.labels(label).observe((perf_counter() - checked_out_at) * 1000)
+        DB_POOL_CHECKED_OUT.labels(label).dec()
+
+    DB_POOL_SIZE.labels(label).set(pool.size())
+    event.listen(engine.sync_engine, "connect", on_connect)
+    event.listen(engine.sync_engine, "close", on_close)
+    event.listen(engine.sync_engine, "close_detached", on_close)
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    event.listen(engine.sync_engine, "checkin", on_checkin)
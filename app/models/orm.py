@@ -1,11 +1,10 @@
 
-from sqlalchemy.inspection import inspect
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func, literal_column
 from sqlalchemy.orm import declarative_base
 
 import uuid
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, Identity
 
 from sqlalchemy.orm import Mapped, mapped_column
 from uuid import UUID as uuid_UUID
@@ -34,56 +33,45 @@ class RentalTableSchema(Base):
     start_date = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     end_date = Column(DateTime(timezone=True), nullable=True)
 
-def deep_update_orm(target, source) -> bool:
-    """
-    Recursively updates `target` ORM instance with values from `source`.
-    Returns True if any field was changed.
-    """
-    changed = False
-
-    mapper = inspect(target.__class__)
-
-    # --- Update scalar columns ---
-    for column in mapper.columns:
-        field = column.key
-
-        if not hasattr(source, field):
-            continue
-
-        new_value = getattr(source, field)
-        old_value = getattr(target, field)
-
-        if new_value != old_value:
-            setattr(target, field, new_value)
-            changed = True
-
-    # --- Update relationships recursively ---
-    for rel in mapper.relationships:
-        field = rel.key
+    __table_args__ = (
+        Index("ix_rentals_car_id_id", "car_id", "id"),
+        Index("ix_rentals_customer_name_id", "customer_name", "id"),
+        Index("ix_rentals_start_date", "start_date"),
+        Index("ix_rentals_end_date", "end_date"),
+    )
 
-        if not hasattr(source, field):
-            continue
+# Column sets for the validation free read path, in Car.from_row / Rental.from_row order
+CAR_ROW_COLUMNS = (CarTableSchema.id, CarTableSchema.company, CarTableSchema.name,
+                   CarTableSchema.year, CarTableSchema.status)
+RENTAL_ROW_COLUMNS = (RentalTableSchema.id, RentalTableSchema.car_id, RentalTableSchema.customer_name,
+                      RentalTableSchema.start_date, RentalTableSchema.end_date)
 
-        new_value = getattr(source, field)
-        old_value = getattr(target, field)
+def rental_period():
+    """
+    The rental's [start_date, end_date] range, spelled exactly like the `ix_rentals_period`
+    GiST index expression so the planner can use it.
+    """
+    return func.tstzrange(RentalTableSchema.start_date, RentalTableSchema.end_date, literal_column("'[]'"))
 
-        if new_value is None:
-            continue
+Index("ix_rentals_period", rental_period(), postgresql_using="gist")
 
-        # One-to-one or many-to-one
-        if not rel.uselist:
-            if old_value is None:
-                setattr(target, field, new_value)
-                changed = True
-            else:
-                if deep_update_orm(old_value, new_value):
-                    changed = True
+def json_object(**fields):
+    """
+    json_build_object with the keys inlined as SQL literals, postgres can't infer
+    types for bound parameters passed to its variadic arguments.
+    """
+    args = []
+    for key, value in fields.items():
+        args.extend([literal_column(f"'{key}'"), value])
+    return func.json_build_object(*args)
 
-        # One-to-many (list relationships)
-        else:
-            # Simple strategy: replace if different
-            if new_value != old_value:
-                setattr(target, field, new_value)
-                changed = True
+class FleetStatusDeltaTableSchema(Base):
+    """
+    Changes to the number of cars per status, appended by triggers on the cars table.
+    A status' count is the sum of its deltas, rows are periodically compacted to one per status.
+    """
+    __tablename__ = "fleet_status_deltas"
 
-    return changed
\ No newline at end of file
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    delta: Mapped[int] = mapped_column(BigInteger, nullable=False)
@@ -1,7 +1,7 @@
 
 # Types
-from pydantic import BaseModel, create_model, model_validator
-from typing import Optional, Literal
+from pydantic import BaseModel, Field, create_model, model_validator
+from typing import Optional, Literal, List
 from enum import Enum
 from uuid import UUID
 from datetime import datetime
@@ -47,6 +47,19 @@ class Car(BaseModel):
             }
         })
 
+    @classmethod
+    def from_row(cls, row) -> "Car":
+        """
+        Builds a Car from an (id, company, name, year, status) row without validation.
+        Only for rows read back from the cars table, which already hold valid values.
+        """
+        car_id, company, name, year, car_status = row
+        return cls.model_construct(
+            id=car_id,
+            model=CarModel.model_construct(company=company, name=name, year=year),
+            status=RentalStatus.model_construct(status=car_status)
+        )
+
     def to_orm(self) -> CarTableSchema:
         """
         Converts a nested Pydantic Car model to an ORM object
@@ -59,23 +72,41 @@ class Car(BaseModel):
             status=self.status.status
         )
 
-    def reconcile_req_diff(self, update_req: "CarUpdateReq") -> None:
-        data = update_req.model_dump(exclude_unset=True)
-
-        # Update the nested model if present
-        if "model" in data:
-            for k, v in data["model"].items():
-                setattr(self.model, k, v)
-
-        # Update status if present
+    @staticmethod
+    def column_updates(update_req: "CarUpdateReq") -> dict:
+        """
+        Maps the fields set in a CarUpdateReq to cars table column values.
+        """
+        data = update_req.model_dump(exclude_unset=True, exclude_none=True)
+        values = dict(data.get("model", {}))
         if "status" in data:
-            self.status.status = data["status"]["status"]
+            values["status"] = data["status"]["status"]
+        return values
 
 CarUpdateReq = create_model(
     'CarUpdateReq',
     **{k: (Optional[v], None) for k, v in Car.__annotations__.items() if k != "id"}
 )
 
+class BulkCarResult(BaseModel):
+    index: int
+    id: Optional[UUID] = None
+    status: Literal["created", "duplicate", "invalid"]
+    detail: Optional[str] = None
+
+class BulkCarStatusReq(BaseModel):
+    status: RentalStatusEnum
+    ids: Optional[List[UUID]] = None
+    company: Optional[str] = None
+    year: Optional[int] = None
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        has_filter = self.company is not None or self.year is not None
+        if (self.ids is None) == (not has_filter):
+            raise ValueError("select cars either by ids or by a company/year filter")
+        return self
+
 # Rentals
 class Rental(BaseModel):
     id: Optional[UUID] = None
@@ -107,6 +138,21 @@ class Rental(BaseModel):
             "end_date": orm_obj.end_date
         })
 
+    @classmethod
+    def from_row(cls, row) -> "Rental":
+        """
+        Builds a Rental from an (id, car_id, customer_name, start_date, end_date) row without validation.
+        Only for rows read back from the rentals table, which already hold valid values.
+        """
+        rental_id, car_id, customer_name, start_date, end_date = row
+        return cls.model_construct(
+            id=rental_id,
+            car_id=car_id,
+            customer_name=customer_name,
+            start_date=start_date,
+            end_date=end_date
+        )
+
     def to_orm(self) -> RentalTableSchema:
         """
         Converts a nested Pydantic Rental model to an ORM object
@@ -124,3 +170,15 @@ RentalUpdateReq = create_model(
     **{k: (Optional[v], None) for k, v in Rental.__annotations__.items() if k != "id"}
 )
 
+# A batch is inserted with one statement binding 5 parameters per rental,
+# postgres takes at most 32767 bind parameters per statement
+RENTAL_BATCH_MAX_SIZE = 32767 // 5
+
+class RentalBatchReq(BaseModel):
+    rentals: List[Rental] = Field(..., max_length=RENTAL_BATCH_MAX_SIZE)
+    mode: Literal["atomic", "partial"] = "atomic"
+
+class RentalBatchFailure(BaseModel):
+    index: int
+    car_id: UUID
+    detail: str
@@ -1,18 +1,46 @@
 
+from fastapi import Response
 from pydantic import BaseModel
 from typing import List, Optional, Literal
-from .items import Rental, RentalStatusEnum, Car
+from uuid import UUID
+from datetime import datetime
+from .items import Rental, RentalStatusEnum, Car, BulkCarResult, RentalBatchFailure
 
 # Rental Responses
 class GetAllRentalsResponse(BaseModel):
     length: int
     rentals: List[Rental]
+    next_cursor: Optional[UUID] = None
+
+class BatchRentalsResponse(BaseModel):
+    created: List[Rental]
+    failed: List[RentalBatchFailure]
 
 # Car Responses
 class GetAllCarsResponse(BaseModel):
     length: int
     filter: Optional[RentalStatusEnum] | Literal["ANY"] = "ANY"
     cars: List[Car]
+    next_cursor: Optional[UUID] = None
+
+class GetAvailableCarsResponse(BaseModel):
+    length: int
+    window_start: datetime
+    window_end: datetime
+    cars: List[Car]
+    next_cursor: Optional[UUID] = None
+
+class BulkAddCarsResponse(BaseModel):
+    total: int
+    created: int
+    rejected: int
+    results: List[BulkCarResult]
+
+class BulkCarStatusResponse(BaseModel):
+    status: RentalStatusEnum
+    updated: List[UUID]
+    skipped_in_use: List[UUID]
+    not_found: List[UUID]
 
 # Health Responses
 class PingResp(BaseModel):
@@ -21,13 +49,42 @@ class PingResp(BaseModel):
 class DBHealthCheckResp(BaseModel):
     msg: Literal["ok"]
 
+class ReadinessResp(BaseModel):
+    msg: Literal["ready"]
+
 # Metric Responses
 class GetActiveCarsResp(BaseModel):
     active_cars: int
 
+class GetFleetStatusResp(BaseModel):
+    available: int
+    in_use: int
+    under_maintenance: int
+    total: int
+
 class GetOngoingRentalsResp(BaseModel):
     ongoing_rentals: int
 
 class GetAverageResponseTimeResp(BaseModel):
     average_response_time_in_ms: float
-    hit_count: int
\ No newline at end of file
+    hit_count: int
+
+class RouteLatencyPercentiles(BaseModel):
+    route: str
+    method: str
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+class GetLatencyPercentilesResp(BaseModel):
+    window_minutes: int
+    routes: List[RouteLatencyPercentiles]
+
+def trusted_json_response(model: BaseModel, status_code: int = 200) -> Response:
+    """
+    Serializes a model built from trusted data straight to json,
+    skipping FastAPI's response_model validation.
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json", status_code=status_code)
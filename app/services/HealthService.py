@@ -28,4 +28,13 @@ class HealthService:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database unavailable"
-            )
\ No newline at end of file
+            )
+
+    @staticmethod
+    async def readiness(ready: bool) -> str:
+        if not ready:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Not ready"
+            )
+        return "ready"
@@ -1,37 +1,79 @@
-
 # Functionality
-from datetime import datetime
+import asyncio
 
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Models and Types
-from ..models.orm import CarTableSchema, RentalTableSchema
-from typing import Tuple
+from ..models.orm import RentalTableSchema, FleetStatusDeltaTableSchema, rental_period
+from ..models.validations.items import RentalStatusEnum
+from typing import Tuple, Dict, List
 
 # Query
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 
 # Observability
-from prometheus_client import REGISTRY
+from ..core.metrics_registry import metrics_registry
+from ..core.latency_window import rolling_latency
 from ..core.logger import logger
 
+FLEET_COMPACTION_LOCK_ID = 4_418_173_013
+
+
 class MetricService:
 
     @staticmethod
     async def get_active_cars(db: AsyncSession) -> int:
 
-        query = select(func.count()).select_from(CarTableSchema)
+        # Sum of the trigger appended status deltas, independent of fleet size
+        query = select(func.coalesce(func.sum(FleetStatusDeltaTableSchema.delta), 0))
         total_active_cars = (await db.execute(query)).scalar_one()
-        return total_active_cars
+        return int(total_active_cars)
+
+    @staticmethod
+    async def get_fleet_status_counts(db: AsyncSession) -> Dict[str, int]:
+
+        query = select(
+            FleetStatusDeltaTableSchema.status, func.sum(FleetStatusDeltaTableSchema.delta)
+        ).group_by(FleetStatusDeltaTableSchema.status)
+        counts = dict((await db.execute(query)).all())
+        return {s.value: int(counts.get(s.value, 0)) for s in RentalStatusEnum}
+
+    @staticmethod
+    async def compact_fleet_status_counts(db: AsyncSession) -> int:
+        """
+        Folds the status deltas appended since the last run into one row per status,
+        keeping the reads above small. Returns the number of rows folded,
+        0 if another worker is compacting right now.
+        """
+        locked = (await db.execute(
+            select(func.pg_try_advisory_xact_lock(FLEET_COMPACTION_LOCK_ID))
+        )).scalar_one()
+        if not locked:
+            return 0
+
+        # the deleted rows are re inserted as their sums in the same statement,
+        # deltas appended concurrently are not seen by the DELETE and stay as they are
+        folded = (await db.execute(text("""
+            WITH moved AS (
+                DELETE FROM fleet_status_deltas RETURNING status, delta
+            ), compacted AS (
+                INSERT INTO fleet_status_deltas (status, delta)
+                SELECT status, sum(delta) FROM moved GROUP BY status HAVING sum(delta) <> 0
+            )
+            SELECT count(*) FROM moved
+        """))).scalar_one()
+        await db.commit()
+        return int(folded)
 
     @staticmethod
     async def get_ongoing_rentals(db: AsyncSession) -> int:
 
-        now = datetime.utcnow()
-        query = select(func.count()).where(
-            RentalTableSchema.start_date <= now,
-            RentalTableSchema.end_date >= now
+        # start_date <= now <= end_date, as a GiST index lookup. A NULL end_date would make the
+        # range unbounded, such rentals are not counted as ongoing
+        query = select(func.count()).select_from(RentalTableSchema).where(
+            rental_period().op("@>")(func.now()),
+            RentalTableSchema.end_date.is_not(None)
         )
         total_ongoing_rentals = (await db.execute(query)).scalar_one()
         return total_ongoing_rentals
@@ -40,13 +82,34 @@ class MetricService:
     async def get_average_response_time() -> Tuple[float, int]:
         """
         Returns the average API request latency in ms
-        from the Prometheus histogram `api_request_latency_ms`.
+        from the Prometheus histogram `api_request_latency_ms`, across all workers.
         """
 
-        # # global Prometheus registry
-        count = REGISTRY.get_sample_value("api_request_latency_ms_count") or 0
-        total = REGISTRY.get_sample_value("api_request_latency_ms_sum") or 0
+        # sum over every route, method and status label
+        count, total = 0.0, 0.0
+        for metric in metrics_registry().collect():
+            if metric.name != "api_request_latency_ms":
+                continue
+            for sample in metric.samples:
+                if sample.name == "api_request_latency_ms_count":
+                    count += sample.value
+                elif sample.name == "api_request_latency_ms_sum":
+                    total += sample.value
 
         # avoid division by zero
         avg = round((total / count if count > 0 else 0.0),2)
-        return avg, int(total)
+        return avg, int(count)
+
+    @staticmethod
+    async def get_latency_percentiles(window_minutes: int) -> List[dict]:
+        """
+        Returns p50/p95/p99/max latency in ms per route over the last `window_minutes`.
+        """
+        if not rolling_latency.aggregated:
+            return rolling_latency.snapshot(window_minutes)
+
+        # reading the other workers' files and merging them runs off the event loop
+        rings = rolling_latency.export()
+        return await asyncio.to_thread(
+            lambda: rolling_latency.percentiles(rings + rolling_latency.read_workers(), window_minutes)
+        )
@@ -2,60 +2,194 @@
 # Response
 from fastapi import HTTPException, status
 from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 
 # Models and Types
-from typing import List
-from uuid import UUID
-from app.models.validations.items import CarUpdateReq, RentalStatusEnum, Car
+from typing import List, Tuple, AsyncIterator
+from uuid import UUID, uuid4
+from datetime import datetime
+from app.models.validations.items import CarUpdateReq, RentalStatusEnum, Car, BulkCarResult, BulkCarStatusReq
 
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Schemas
-from app.models.orm import CarTableSchema, deep_update_orm
+from app.models.orm import CarTableSchema, RentalTableSchema, CAR_ROW_COLUMNS, rental_period, json_object
 
 # Query
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, exists, func, case, cast, literal, literal_column, bindparam, any_, Text
+from sqlalchemy.dialects.postgresql import insert, array_agg, aggregate_order_by, ARRAY
+
+# Config
+from ..core.config import settings
+
+# Cache
+from ..core.cache import car_cache
+from ..core.database import is_replica_session
 
 # Observability
 from ..core.logger import logger
 
 class CarService:
 
+    @staticmethod
+    def _hydrate(row) -> Car:
+        """
+        Builds a Car from a CAR_ROW_COLUMNS row, skipping validation when FAST_READS is on.
+        """
+        return Car.from_row(row) if settings.FAST_READS else Car.from_orm(row)
+
     @staticmethod
     async def get_one_by_id(db: AsyncSession, car_id: UUID):
 
+        # Serve from cache when possible
+        if settings.CAR_CACHE_ENABLED:
+            car = car_cache.get(car_id)
+            if car is not None:
+                return car
+            generation = car_cache.generation()
+
         # Make Query
-        query = select(CarTableSchema).where(CarTableSchema.id == car_id)
+        query = select(*CAR_ROW_COLUMNS).where(CarTableSchema.id == car_id)
 
         result = await db.execute(query)
-        car_orm = result.scalar_one_or_none()
-        if not car_orm:
-            logger.warning(f"Car with id {car_id} not found in database")
+        car_row = result.one_or_none()
+        if not car_row:
+            logger.warning("Car with id %s not found in database", car_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Car with id {car_id} not found."
             )
-        car = Car.from_orm(car_orm)
+        car = CarService._hydrate(car_row)
+
+        # Only rows from the primary are cached, a replica row put after an invalidation
+        # would be served to clients reading their own writes until it expires
+        if settings.CAR_CACHE_ENABLED and not is_replica_session(db):
+            car_cache.put(car_id, car, generation)
         return car
 
     @staticmethod
-    async def get_all(db: AsyncSession, status_filter: RentalStatusEnum | None = None) -> List[Car]:
-
-        # Make Query
-        query = select(CarTableSchema)
+    def _list_query(status_filter: RentalStatusEnum | None = None, after: UUID | None = None):
+        """
+        Builds the cars listing query, ordered by id so it can be used as a stable keyset.
+        """
+        query = select(*CAR_ROW_COLUMNS).order_by(CarTableSchema.id)
         if status_filter:
             query = query.where(CarTableSchema.status == status_filter.value)
+        if after:
+            query = query.where(CarTableSchema.id > after)
+        return query
+
+    @staticmethod
+    async def get_all(db: AsyncSession,
+                      status_filter: RentalStatusEnum | None = None,
+                      limit: int | None = None,
+                      after: UUID | None = None) -> List[Car]:
+
+        # Make Query
+        query = CarService._list_query(status_filter=status_filter, after=after)
+        if limit:
+            query = query.limit(limit)
 
         # Send Query and return
         result = await db.execute(query)
-        cars_orm = result.scalars().all()
-        cars = [Car.from_orm(c) for c in cars_orm if c is not None]
+        cars = [CarService._hydrate(row) for row in result.all()]
 
         if not cars:
             logger.warning("No Cars match query!")
         return cars
 
+    @staticmethod
+    async def get_all_json(db: AsyncSession,
+                           status_filter: RentalStatusEnum | None = None,
+                           limit: int | None = None,
+                           after: UUID | None = None) -> str:
+        """
+        Renders the whole GetAllCarsResponse document in postgres and returns it as json text.
+        """
+
+        # The page, as in get_all
+        query = CarService._list_query(status_filter=status_filter, after=after)
+        if limit:
+            query = query.limit(limit)
+        page = query.subquery("page")
+
+        # Build the response document from the page
+        car = json_object(
+            id=page.c.id,
+            model=json_object(company=page.c.company, name=page.c.name, year=page.c.year),
+            status=json_object(status=page.c.status)
+        )
+        last_id = array_agg(aggregate_order_by(page.c.id, page.c.id.desc()))[1]
+        document = json_object(
+            length=func.count(),
+            filter=cast(literal(status_filter.value if status_filter else "ANY"), Text),
+            cars=func.coalesce(func.json_agg(aggregate_order_by(car, page.c.id)), literal_column("'[]'::json")),
+            next_cursor=case((func.count() == (limit or 0), last_id), else_=None)
+        )
+
+        # Send Query and return
+        result = await db.execute(select(cast(document, Text)).select_from(page))
+        return result.scalar_one()
+
+    @staticmethod
+    async def stream_all(db: AsyncSession,
+                         status_filter: RentalStatusEnum | None = None,
+                         after: UUID | None = None,
+                         batch_size: int = 1000) -> AsyncIterator[Car]:
+        """
+        Yields cars one by one through a server-side cursor, fetching `batch_size` rows at a time.
+        """
+
+        # Make Query
+        query = CarService._list_query(status_filter=status_filter, after=after)
+        query = query.execution_options(yield_per=batch_size)
+
+        # Stream rows as they arrive
+        result = await db.stream(query)
+        async for row in result:
+            yield CarService._hydrate(row)
+
+    @staticmethod
+    async def get_available(db: AsyncSession,
+                            window_start: datetime,
+                            window_end: datetime,
+                            company: str | None = None,
+                            year: int | None = None,
+                            limit: int | None = None,
+                            after: UUID | None = None) -> List[Car]:
+        """
+        Returns cars that are not under maintenance and have no rental overlapping the
+        [window_start, window_end) window, as a single anti-join on the rentals period index.
+        """
+
+        # Make Query
+        overlapping = exists().where(
+            RentalTableSchema.car_id == CarTableSchema.id,
+            rental_period().op("&&")(func.tstzrange(window_start, window_end, "[)"))
+        )
+        query = (
+            select(*CAR_ROW_COLUMNS)
+            .where(CarTableSchema.status != RentalStatusEnum.under_maintenance.value, ~overlapping)
+            .order_by(CarTableSchema.id)
+        )
+        if company:
+            query = query.where(CarTableSchema.company == company)
+        if year:
+            query = query.where(CarTableSchema.year == year)
+        if after:
+            query = query.where(CarTableSchema.id > after)
+        if limit:
+            query = query.limit(limit)
+
+        # Send Query and return
+        result = await db.execute(query)
+        cars = [CarService._hydrate(row) for row in result.all()]
+
+        if not cars:
+            logger.warning("No Cars are available in the window!")
+        return cars
+
     @staticmethod
     async def add_one(db: AsyncSession, car: Car) -> Car:
 
@@ -75,85 +209,181 @@ class CarService:
 
         return car
 
+    @staticmethod
+    async def add_many(db: AsyncSession, records: AsyncIterator[dict],
+                       batch_size: int = settings.CAR_BULK_BATCH_SIZE) -> List[BulkCarResult]:
+        """
+        Validates raw car records in batches and inserts each batch with a single multi-row
+        INSERT ... ON CONFLICT DO NOTHING. Invalid and duplicate rows are reported per row
+        instead of aborting the import.
+        """
+        results: List[BulkCarResult] = []
+        batch: List[Tuple[int, Car]] = []
+
+        index = 0
+        async for record in records:
+            try:
+                car = Car.model_validate(record)
+            except ValidationError as e:
+                error = e.errors()[0]
+                loc = ".".join(str(part) for part in error["loc"])
+                detail = f"{loc}: {error['msg']}" if loc else error["msg"]
+                results.append(BulkCarResult(index=index, status="invalid", detail=detail))
+            else:
+                if car.id is None:
+                    car.id = uuid4()
+                batch.append((index, car))
+
+            if len(batch) >= batch_size:
+                results.extend(await CarService._insert_batch(db=db, batch=batch))
+                batch = []
+            index += 1
+
+        if batch:
+            results.extend(await CarService._insert_batch(db=db, batch=batch))
+
+        results.sort(key=lambda r: r.index)
+        return results
+
+    @staticmethod
+    async def _insert_batch(db: AsyncSession, batch: List[Tuple[int, Car]]) -> List[BulkCarResult]:
+
+        # One round trip for the whole batch, existing ids are skipped by postgres
+        query = (
+            insert(CarTableSchema)
+            .values([{"id": car.id,
+                      "company": car.model.company,
+                      "name": car.model.name,
+                      "year": car.model.year,
+                      "status": car.status.status} for _, car in batch])
+            .on_conflict_do_nothing(index_elements=[CarTableSchema.id])
+            .returning(CarTableSchema.id)
+        )
+        inserted = set((await db.execute(query)).scalars().all())
+
+        # Rows not returned already existed, or repeat an id earlier in the batch
+        results = []
+        for index, car in batch:
+            if car.id in inserted:
+                inserted.discard(car.id)
+                results.append(BulkCarResult(index=index, id=car.id, status="created"))
+            else:
+                results.append(BulkCarResult(index=index, id=car.id, status="duplicate",
+                                             detail=f"Car with id {car.id} already exists"))
+        return results
+
     @staticmethod
     async def update_one_by_id(db: AsyncSession, car_id: UUID, update_req: CarUpdateReq) -> Car:
+        """
+        Applies the fields set in `update_req` with a single UPDATE ... RETURNING,
+        a missing car shows up as no row returned.
+        """
+        values = Car.column_updates(update_req)
+
+        # One round trip either way, an empty request just reads the car back
+        if values:
+            query = (
+                update(CarTableSchema)
+                .where(CarTableSchema.id == car_id)
+                .values(**values)
+                .returning(*CAR_ROW_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            query = select(*CAR_ROW_COLUMNS).where(CarTableSchema.id == car_id)
 
-        # Fetch existing car
-        query = select(CarTableSchema).where(CarTableSchema.id == car_id)
-        result = await db.execute(query)
-        car_orm = result.scalar_one_or_none()
+        try:
+            car_row = (await db.execute(query)).one_or_none()
+        except IntegrityError:
+            logger.warning("Update of car %s caused conflict.", car_id)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Update caused conflict."
+            )
 
         # no record to update!
-        if not car_orm:
-            logger.warning(f"Car with id {car_id} not found")
+        if not car_row:
+            logger.warning("Car with id %s not found", car_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Car with id {car_id} not found."
             )
 
-        # Apply updates from CarUpdateReq
-        car = Car.from_orm(car_orm)
-        car.reconcile_req_diff(update_req)
-
-        # Push back to ORM for update only if changes made
-        updated_orm = car.to_orm()
-        changed = deep_update_orm(car_orm, updated_orm)
+        # Other workers are notified by the cars table trigger once committed
+        if values:
+            car_cache.invalidate(car_id)
+        return CarService._hydrate(car_row)
 
-        # Try to update
-        if changed:
-            try:
-                await db.commit()
-                await db.refresh(car_orm)
-            except IntegrityError:
-                await db.rollback()
-                logger.warning("Update caused conflict.")
-                raise HTTPException(
-                    status_code=409,
-                    detail=f"Update caused conflict."
-                )
-
-            # Return updated car
-            return Car.from_orm(car_orm)
-
-        else:
-            logger.warning("Nothing in request requires updating existing value - skipping set query")
-            return car # no update!
+    @staticmethod
+    async def set_status_many(db: AsyncSession,
+                              req: BulkCarStatusReq) -> Tuple[List[UUID], List[UUID], List[UUID]]:
+        """
+        Moves the selected cars to `req.status` in one statement. Matching rows are locked
+        in id order, like rental batches, so the two can't deadlock, and cars in use are skipped.
+        Returns the updated, skipped and not found ids.
+        """
+
+        # Select cars by id list, bound as a single array so the statement text never changes
+        matched = select(CarTableSchema.id, CarTableSchema.status)
+        if req.ids is not None:
+            ids = bindparam("ids", req.ids, type_=ARRAY(CarTableSchema.id.type))
+            matched = matched.where(CarTableSchema.id == any_(ids))
+        if req.company is not None:
+            matched = matched.where(CarTableSchema.company == req.company)
+        if req.year is not None:
+            matched = matched.where(CarTableSchema.year == req.year)
+        matched = matched.order_by(CarTableSchema.id).with_for_update().cte("matched")
+
+        updated = (
+            update(CarTableSchema)
+            .where(CarTableSchema.id == matched.c.id,
+                   matched.c.status != RentalStatusEnum.in_use.value)
+            .values(status=req.status.value)
+            .returning(CarTableSchema.id)
+            .cte("updated")
+        )
+        query = (
+            select(matched.c.id, updated.c.id.label("updated_id"))
+            .select_from(matched.outerjoin(updated, updated.c.id == matched.c.id))
+            .order_by(matched.c.id)
+        )
+        rows = (await db.execute(query)).all()
+
+        updated_ids = [row.id for row in rows if row.updated_id is not None]
+        skipped_ids = [row.id for row in rows if row.updated_id is None]
+        found = {row.id for row in rows}
+        not_found_ids = [car_id for car_id in dict.fromkeys(req.ids or []) if car_id not in found]
+
+        # Other workers are notified by the cars table trigger once committed
+        for car_id in updated_ids:
+            car_cache.invalidate(car_id)
+
+        logger.info("Set %s Cars to status %s, %s in use, %s not found",
+                    len(updated_ids), req.status.value, len(skipped_ids), len(not_found_ids))
+        return updated_ids, skipped_ids, not_found_ids
 
     @staticmethod
     async def delete_one_by_id(db: AsyncSession, car_id: UUID) -> None:
 
-        # Fetch the existing record
-        query = select(CarTableSchema).where(CarTableSchema.id == car_id)
-        result = await db.execute(query)
-        car_orm = result.scalar_one_or_none()
-
-        # no record exists
-        if not car_orm:
-            logger.warning(f"Car with id {car_id} not found.")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Car with id {car_id} not found."
-            )
-
-        # Delete record
+        # Delete record, a missing car shows up as no id returned
+        query = delete(CarTableSchema).where(CarTableSchema.id == car_id).returning(CarTableSchema.id)
         try:
-            await db.delete(car_orm)
-            await db.commit()
+            deleted_id = (await db.execute(query)).scalar_one_or_none()
 
         except IntegrityError:
-            await db.rollback()
-            logger.warning(f"Cannot delete car {car_id} due to database constraints.")
+            logger.warning("Cannot delete car %s due to database constraints.", car_id)
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Cannot delete car {car_id} due to database constraints."
             )
 
-        except Exception as e:
-            await db.rollback()
-            logger.warning(f"Unexpected error occurred while deleting car {car_id}.")
+        # no record exists
+        if deleted_id is None:
+            logger.warning("Car with id %s not found.", car_id)
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Unexpected error occurred while deleting car {car_id}."
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Car with id {car_id} not found."
             )
 
-        return
\ No newline at end of file
+        # Other workers are notified by the cars table trigger once committed
+        car_cache.invalidate(car_id)
@@ -3,107 +3,348 @@
 from fastapi import HTTPException, status
 
 # Models and Types
-from typing import List
-from uuid import UUID
-from app.models.validations.items import Rental, RentalStatusEnum
-from app.models.orm import RentalTableSchema, CarTableSchema
+from typing import List, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime
+from app.models.validations.items import Rental, RentalStatusEnum, RentalBatchFailure
+from app.models.orm import RentalTableSchema, CarTableSchema, RENTAL_ROW_COLUMNS, rental_period, json_object
 
 # Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Query
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, func, case, cast, literal, literal_column, true, Text
+from sqlalchemy.dialects.postgresql import insert, array_agg, aggregate_order_by
+
+# Config
+from ..core.config import settings
+
+# Cache
+from ..core.cache import car_cache
 
 # Observability
 from ..core.logger import logger
 
 class RentalService:
 
+    @staticmethod
+    def _hydrate(row) -> Rental:
+        """
+        Builds a Rental from a RENTAL_ROW_COLUMNS row, skipping validation when FAST_READS is on.
+        """
+        return Rental.from_row(row) if settings.FAST_READS else Rental.from_orm(row)
+
     @staticmethod
     async def get_one_by_id(db: AsyncSession, rental_id: UUID) -> Rental:
 
         # Make Query
-        query = select(RentalTableSchema).where(RentalTableSchema.id == rental_id)
+        query = select(*RENTAL_ROW_COLUMNS).where(RentalTableSchema.id == rental_id)
 
         result = await db.execute(query)
-        rental_orm = result.scalar_one_or_none()
-        if not rental_orm:
-            logger.warning(f"Rental with id {rental_id} not found.")
+        rental_row = result.one_or_none()
+        if not rental_row:
+            logger.warning("Rental with id %s not found.", rental_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Rental with id {rental_id} not found."
             )
-        rental = Rental.from_orm(rental_orm)
+        rental = RentalService._hydrate(rental_row)
         return rental
 
 
     @staticmethod
-    async def get_all(db: AsyncSession) -> List[Rental]:
+    def _list_query(car_id: UUID | None = None,
+                    customer_name: str | None = None,
+                    start_from: datetime | None = None,
+                    start_to: datetime | None = None,
+                    end_from: datetime | None = None,
+                    end_to: datetime | None = None,
+                    after: UUID | None = None):
+        """
+        Builds the rentals listing query, ordered by id so it can be used as a stable keyset.
+        Date windows are half open: [from, to).
+        """
+        query = select(*RENTAL_ROW_COLUMNS).order_by(RentalTableSchema.id)
+        if car_id:
+            query = query.where(RentalTableSchema.car_id == car_id)
+        if customer_name:
+            query = query.where(RentalTableSchema.customer_name == customer_name)
+        if start_from:
+            query = query.where(RentalTableSchema.start_date >= start_from)
+        if start_to:
+            query = query.where(RentalTableSchema.start_date < start_to)
+        if end_from:
+            query = query.where(RentalTableSchema.end_date >= end_from)
+        if end_to:
+            query = query.where(RentalTableSchema.end_date < end_to)
+        if after:
+            query = query.where(RentalTableSchema.id > after)
+        return query
+
+    @staticmethod
+    async def get_all(db: AsyncSession,
+                      car_id: UUID | None = None,
+                      customer_name: str | None = None,
+                      start_from: datetime | None = None,
+                      start_to: datetime | None = None,
+                      end_from: datetime | None = None,
+                      end_to: datetime | None = None,
+                      limit: int | None = None,
+                      after: UUID | None = None) -> List[Rental]:
 
         # Make Query
-        query = select(RentalTableSchema)
+        query = RentalService._list_query(car_id=car_id, customer_name=customer_name,
+                                          start_from=start_from, start_to=start_to,
+                                          end_from=end_from, end_to=end_to,
+                                          after=after)
+        if limit:
+            query = query.limit(limit)
 
         # Send Query and return
         result = await db.execute(query)
-        rentals_orm = result.scalars().all()
-        rentals = [Rental.from_orm(r) for r in rentals_orm if r is not None]
+        rentals = [RentalService._hydrate(row) for row in result.all()]
 
         if not rentals:
             logger.warning("No Rentals found!")
         return rentals
 
+    @staticmethod
+    async def get_all_json(db: AsyncSession,
+                           car_id: UUID | None = None,
+                           customer_name: str | None = None,
+                           start_from: datetime | None = None,
+                           start_to: datetime | None = None,
+                           end_from: datetime | None = None,
+                           end_to: datetime | None = None,
+                           limit: int | None = None,
+                           after: UUID | None = None) -> str:
+        """
+        Renders the whole GetAllRentalsResponse document in postgres and returns it as json text.
+        """
+
+        # The page, as in get_all
+        query = RentalService._list_query(car_id=car_id, customer_name=customer_name,
+                                          start_from=start_from, start_to=start_to,
+                                          end_from=end_from, end_to=end_to,
+                                          after=after)
+        if limit:
+            query = query.limit(limit)
+        page = query.subquery("page")
+
+        # Build the response document from the page
+        rental = json_object(
+            id=page.c.id,
+            car_id=page.c.car_id,
+            customer_name=page.c.customer_name,
+            start_date=page.c.start_date,
+            end_date=page.c.end_date
+        )
+        last_id = array_agg(aggregate_order_by(page.c.id, page.c.id.desc()))[1]
+        document = json_object(
+            length=func.count(),
+            rentals=func.coalesce(func.json_agg(aggregate_order_by(rental, page.c.id)), literal_column("'[]'::json")),
+            next_cursor=case((func.count() == (limit or 0), last_id), else_=None)
+        )
+
+        # Send Query and return
+        result = await db.execute(select(cast(document, Text)).select_from(page))
+        return result.scalar_one()
+
+    @staticmethod
+    async def get_overlapping(db: AsyncSession,
+                              window_start: datetime,
+                              window_end: datetime,
+                              limit: int | None = None,
+                              after: UUID | None = None) -> List[Rental]:
+        """
+        Returns rentals whose [start_date, end_date] overlaps the [window_start, window_end) window.
+        """
+
+        # Make Query
+        query = (
+            select(*RENTAL_ROW_COLUMNS)
+            .where(rental_period().op("&&")(func.tstzrange(window_start, window_end, "[)")))
+            .order_by(RentalTableSchema.id)
+        )
+        if after:
+            query = query.where(RentalTableSchema.id > after)
+        if limit:
+            query = query.limit(limit)
+
+        # Send Query and return
+        result = await db.execute(query)
+        rentals = [RentalService._hydrate(row) for row in result.all()]
+
+        if not rentals:
+            logger.warning("No Rentals overlap the window!")
+        return rentals
+
     @staticmethod
     async def add_one(db: AsyncSession, rental: Rental) -> Rental:
-        rental_orm = rental.to_orm()
+        """
+        Books a car in one statement: the car is flipped from available to in use,
+        and the rental is inserted only if the flip matched a row.
+        """
+        rental_id = rental.id or uuid4()
 
+        # Flip the car, the row lock is held only for the rest of this statement's transaction
+        flipped = (
+            update(CarTableSchema)
+            .where(CarTableSchema.id == rental.car_id,
+                   CarTableSchema.status == RentalStatusEnum.available.value)
+            .values(status=RentalStatusEnum.in_use.value)
+            .returning(CarTableSchema.id)
+            .cte("flipped")
+        )
+        inserted = (
+            insert(RentalTableSchema)
+            .from_select(
+                ["id", "car_id", "customer_name", "start_date", "end_date"],
+                select(literal(rental_id, RentalTableSchema.id.type),
+                       flipped.c.id,
+                       literal(rental.customer_name, RentalTableSchema.customer_name.type),
+                       literal(rental.start_date, RentalTableSchema.start_date.type),
+                       literal(rental.end_date, RentalTableSchema.end_date.type))
+            )
+            .returning(*RENTAL_ROW_COLUMNS)
+            .cte("inserted")
+        )
+
+        # The car's status as of the statement snapshot tells a missing car from an unavailable one
+        car_status = select(CarTableSchema.status).where(CarTableSchema.id == rental.car_id).scalar_subquery()
+        query = select(car_status.label("car_status"), *inserted.c).select_from(
+            select(literal(1)).subquery("one").outerjoin(inserted, true())
+        )
+        row = (await db.execute(query)).one()
+
+        if row.id is None:
+            if row.car_status is None:
+                logger.warning("Car %s not found", rental.car_id)
+                raise HTTPException(status_code=404, detail=f"Car {rental.car_id} not found")
+
+            logger.warning("Car %s is not available, current status: %s", rental.car_id, row.car_status)
+            raise HTTPException(status_code=400, detail="Car is not available")
+
+        car_cache.invalidate(rental.car_id)
+        logger.info("Rental %s created for car %s", row.id, row.car_id)
+        return Rental.from_orm(row)
+
+    @staticmethod
+    async def add_many(db: AsyncSession, rentals: List[Rental],
+                       atomic: bool = True) -> Tuple[List[Rental], List[RentalBatchFailure]]:
+        """
+        Books several cars in one transaction.
+        Car rows are locked in id order so overlapping batches can't deadlock, availability is
+        checked with one query, and rentals and car statuses are written with one statement each.
+        When `atomic`, any failure rejects the whole batch.
+        """
+
+        # Lock all requested cars in a deterministic order, and read their status
+        car_ids = sorted({r.car_id for r in rentals})
         result = await db.execute(
-            select(CarTableSchema)
-            .where(CarTableSchema.id == rental_orm.car_id)
+            select(CarTableSchema.id, CarTableSchema.status)
+            .where(CarTableSchema.id.in_(car_ids))
+            .order_by(CarTableSchema.id)
             .with_for_update()
         )
-        car = result.scalar_one_or_none()
+        car_statuses = dict(result.all())
 
-        if not car:
-            logger.warning(f"Car {rental_orm.car_id} not found")
-            raise HTTPException(status_code=404, detail=f"Car {rental_orm.car_id} not found")
+        # Decide per rental, a car can only be taken once per batch
+        accepted: List[Tuple[int, Rental]] = []
+        failed: List[RentalBatchFailure] = []
+        for index, rental in enumerate(rentals):
+            car_status = car_statuses.get(rental.car_id)
+            if car_status is None:
+                failed.append(RentalBatchFailure(index=index, car_id=rental.car_id,
+                                                 detail=f"Car {rental.car_id} not found"))
+            elif car_status != RentalStatusEnum.available.value:
+                failed.append(RentalBatchFailure(index=index, car_id=rental.car_id,
+                                                 detail="Car is not available"))
+            else:
+                car_statuses[rental.car_id] = RentalStatusEnum.in_use.value
+                accepted.append((index, rental.model_copy(update={"id": rental.id or uuid4()})))
 
-        if car.status != RentalStatusEnum.available.value:
-            logger.warning(f"Car {rental_orm.car_id} is not available, current status: {car.status}")
-            raise HTTPException(status_code=400, detail="Car is not available")
+        if failed and atomic:
+            logger.warning("Rental batch rejected, %s of %s rentals failed", len(failed), len(rentals))
+            raise HTTPException(status_code=400, detail=[f.model_dump(mode="json") for f in failed])
+
+        if not accepted:
+            return [], failed
+
+        # Insert all rentals at once, existing rental ids are skipped
+        result = await db.execute(
+            insert(RentalTableSchema)
+            .values([{"id": r.id,
+                      "car_id": r.car_id,
+                      "customer_name": r.customer_name,
+                      "start_date": r.start_date,
+                      "end_date": r.end_date} for _, r in accepted])
+            .on_conflict_do_nothing(index_elements=[RentalTableSchema.id])
+            .returning(RentalTableSchema.id)
+        )
+        inserted = set(result.scalars().all())
 
-        car.status = RentalStatusEnum.in_use.value
-        db.add(rental_orm)
-        await db.flush()
-        await db.refresh(rental_orm)
-        logger.info(f"Rental {rental_orm.id} created for car {rental_orm.car_id}")
-        return Rental.from_orm(rental_orm)
+        created: List[Rental] = []
+        for index, rental in accepted:
+            if rental.id in inserted:
+                inserted.discard(rental.id)
+                created.append(rental)
+            else:
+                failed.append(RentalBatchFailure(index=index, car_id=rental.car_id,
+                                                 detail=f"Rental with id {rental.id} already exists"))
+
+        if failed and atomic:
+            logger.warning("Rental batch rejected, %s of %s rentals failed", len(failed), len(rentals))
+            raise HTTPException(status_code=400, detail=[f.model_dump(mode="json") for f in failed])
+
+        # Flip all booked cars at once
+        if created:
+            await db.execute(
+                update(CarTableSchema)
+                .where(CarTableSchema.id.in_([r.car_id for r in created]))
+                .values(status=RentalStatusEnum.in_use.value)
+                .execution_options(synchronize_session=False)
+            )
+            for rental in created:
+                car_cache.invalidate(rental.car_id)
+
+        failed.sort(key=lambda f: f.index)
+        logger.info("Rental batch created %s rentals, %s failed", len(created), len(failed))
+        return created, failed
 
     @staticmethod
     async def delete_one_by_id(db: AsyncSession, rental_id: UUID) -> None:
+        """
+        Ends a rental in one statement: the rental is deleted and its car, if in use,
+        is set back to available.
+        """
+        deleted = (
+            delete(RentalTableSchema)
+            .where(RentalTableSchema.id == rental_id)
+            .returning(RentalTableSchema.car_id)
+            .cte("deleted")
+        )
+        released = (
+            update(CarTableSchema)
+            .where(CarTableSchema.id == deleted.c.car_id,
+                   CarTableSchema.status == RentalStatusEnum.in_use.value)
+            .values(status=RentalStatusEnum.available.value)
+            .returning(CarTableSchema.id)
+            .cte("released")
+        )
+        query = select(select(deleted.c.car_id).scalar_subquery().label("car_id"),
+                       select(released.c.id).scalar_subquery().label("released_car_id"))
+        row = (await db.execute(query)).one()
 
-        # Fetch rental
-        result = await db.execute(select(RentalTableSchema).where(RentalTableSchema.id == rental_id))
-        rental_orm: RentalTableSchema = result.scalar_one_or_none()
-        if not rental_orm:
-            logger.warning(f"Rental {rental_id} not found.")
+        if row.car_id is None:
+            logger.warning("Rental %s not found.", rental_id)
             raise HTTPException(
                 status_code=404,
                 detail=f"Rental {rental_id} not found."
             )
 
-        # Fetch car
-        result = await db.execute(
-            select(CarTableSchema)
-            .where(CarTableSchema.id == rental_orm.car_id)
-            .with_for_update()
-        )
-        car: CarTableSchema = result.scalar_one_or_none()
-
         # Update car status if needed
-        if car and car.status == RentalStatusEnum.in_use.value:
-            car.status = RentalStatusEnum.available.value
-            logger.info(f"Deleted Rental with id: {rental_id}, and set Car with id: {car.id} to status: {car.status}")
-
-        # Delete rental
-        await db.delete(rental_orm)
-        await db.flush()
\ No newline at end of file
+        if row.released_car_id is not None:
+            car_cache.invalidate(row.released_car_id)
+            logger.info("Deleted Rental with id: %s, and set Car with id: %s to status: %s",
+                        rental_id, row.released_car_id, RentalStatusEnum.available.value)
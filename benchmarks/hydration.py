@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the car / rental read path, per row, without a database.
+
+before: ORM objects -> from_orm (model_validate) -> response_model validation -> json
+after:  row tuples  -> from_row (model_construct) -> model_dump_json
+
+Run from the repository root:
+    python -m benchmarks.hydration
+"""
+
+# Functionality
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+# Types
+from typing import Callable, List
+
+# Models
+from app.models.orm import CarTableSchema, RentalTableSchema
+from app.models.validations.items import Car, Rental
+from app.models.validations.responses import GetAllCarsResponse, GetAllRentalsResponse
+
+ROW_COUNTS = [10_000, 100_000]
+STATUSES = ["available", "in use", "under maintenance"]
+
+
+def car_rows(n: int) -> List[tuple]:
+    return [(uuid.uuid4(), "TestCo", f"Car {i}", 2000 + i % 25, STATUSES[i % 3]) for i in range(n)]
+
+
+def rental_rows(n: int) -> List[tuple]:
+    now = datetime.now(timezone.utc)
+    return [(uuid.uuid4(), uuid.uuid4(), f"Customer {i}", now, now + timedelta(days=3)) for i in range(n)]
+
+
+def cars_before(rows: List[tuple]) -> bytes:
+    cars_orm = [CarTableSchema(id=r[0], company=r[1], name=r[2], year=r[3], status=r[4]) for r in rows]
+    cars = [Car.from_orm(c) for c in cars_orm]
+
+    # What FastAPI does with a dict returned against response_model
+    content = {"length": len(cars), "filter": "ANY", "cars": [c.model_dump() for c in cars]}
+    resp = GetAllCarsResponse.model_validate(content)
+    return json.dumps(resp.model_dump(mode="json")).encode()
+
+
+def cars_after(rows: List[tuple]) -> bytes:
+    cars = [Car.from_row(r) for r in rows]
+    return GetAllCarsResponse.model_construct(length=len(cars), filter="ANY", cars=cars, next_cursor=None).model_dump_json()
+
+
+def rentals_before(rows: List[tuple]) -> bytes:
+    rentals_orm = [RentalTableSchema(id=r[0], car_id=r[1], customer_name=r[2], start_date=r[3], end_date=r[4])
+                   for r in rows]
+    rentals = [Rental.from_orm(r) for r in rentals_orm]
+
+    content = {"length": len(rentals), "rentals": [r.model_dump() for r in rentals]}
+    resp = GetAllRentalsResponse.model_validate(content)
+    return json.dumps(resp.model_dump(mode="json")).encode()
+
+
+def rentals_after(rows: List[tuple]) -> bytes:
+    rentals = [Rental.from_row(r) for r in rows]
+    return GetAllRentalsResponse.model_construct(length=len(rentals), rentals=rentals, next_cursor=None).model_dump_json()
+
+
+def per_row_us(fn: Callable[[List[tuple]], bytes], rows: List[tuple], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(rows)
+        best = min(best, perf_counter() - start)
+    return best / len(rows) * 1_000_000
+
+
+def main() -> None:
+    print(f"{'path':<10}{'rows':>10}{'before us/row':>16}{'after us/row':>16}{'speedup':>10}")
+    for name, make_rows, before, after in [("cars", car_rows, cars_before, cars_after),
+                                           ("rentals", rental_rows, rentals_before, rentals_after)]:
+        for n in ROW_COUNTS:
+            rows = make_rows(n)
+            b = per_row_us(before, rows)
+            a = per_row_us(after, rows)
+            print(f"{name:<10}{n:>10}{b:>16.2f}{a:>16.2f}{b / a:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import asyncio
+from contextlib import asynccontextmanager
 import re
 import os
 import pytest_asyncio
@@ -71,10 +72,16 @@ async def db_session(postgres_container, run_migrations):
 @pytest_asyncio.fixture
 async def client(db_session):
     """Provides AsyncClient wired to the ephemeral test DB session"""
-    from app.core.database import get_db_session
+    from app.core.database import get_db_session, get_read_db_session, get_read_db_sessionmaker
     from httpx import ASGITransport
 
+    @asynccontextmanager
+    async def test_sessions():
+        yield db_session
+
     app.dependency_overrides[get_db_session] = lambda: db_session
+    app.dependency_overrides[get_read_db_session] = lambda: db_session
+    app.dependency_overrides[get_read_db_sessionmaker] = lambda: test_sessions
 
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True) as ac:
         yield ac
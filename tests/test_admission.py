@@ -0,0 +1,119 @@
+import pytest
+import uuid
+from types import SimpleNamespace
+from app.api import admission
+from app.api.admission import AdaptiveLimiter, AdmissionControlMiddleware, admission_limiter
+
+
+def make_limiter(**overrides) -> AdaptiveLimiter:
+    options = {"initial": 4, "min_limit": 1, "max_limit": 10,
+               "latency_target_ms": 100, "backoff": 0.5, "pool_capacity": 5}
+    options.update(overrides)
+    return AdaptiveLimiter(**options)
+
+
+# ── AIMD limit ─────────────────────────────────────────────────────────────────
+def test_limiter_rejects_over_limit():
+    limiter = make_limiter(initial=2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release(latency_ms=1, failed=False)
+    assert limiter.try_acquire()
+
+
+def test_limiter_grows_when_fast_and_backs_off_when_slow():
+    limiter = make_limiter()
+
+    for _ in range(8):
+        limiter.try_acquire()
+        limiter.release(latency_ms=1, failed=False, pool_checked_out=0)
+    assert 5 < limiter.limit <= 6
+
+    limiter.try_acquire()
+    limiter.release(latency_ms=1000, failed=False, pool_checked_out=0)
+    grown = limiter.limit
+    assert grown < 3
+
+    # a burst of slow requests only counts once per target latency
+    limiter.try_acquire()
+    limiter.release(latency_ms=1000, failed=False, pool_checked_out=0)
+    assert limiter.limit == grown
+
+
+def test_limiter_backs_off_on_pool_exhaustion_and_errors():
+    limiter = make_limiter(latency_target_ms=0)
+
+    limiter.try_acquire()
+    limiter.release(latency_ms=0, failed=False, pool_checked_out=5)
+    assert limiter.limit == 2
+
+    limiter.try_acquire()
+    limiter.release(latency_ms=0, failed=True, pool_checked_out=0)
+    assert limiter.limit == 1
+
+
+# ── Middleware ─────────────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_requests_over_limit_get_503_but_health_and_metrics_pass(client, monkeypatch):
+    monkeypatch.setattr(admission_limiter, "limit", 0)
+
+    resp = await client.get("/v1/cars/")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+    assert (await client.get("/health/ping")).status_code == 200
+    assert (await client.get("/metrics/avgresp")).status_code == 200
+
+
+def fake_engine(checked_out: int):
+    return SimpleNamespace(sync_engine=SimpleNamespace(pool=SimpleNamespace(checkedout=lambda: checked_out)))
+
+
+@pytest.mark.asyncio
+async def test_reads_back_off_on_replica_pool_exhaustion(client, monkeypatch):
+    capacity = admission_limiter.pool_capacity
+    monkeypatch.setattr(admission, "engine", fake_engine(0))
+    monkeypatch.setattr(admission, "read_engine", fake_engine(capacity))
+    monkeypatch.setattr(admission_limiter, "latency_target_ms", 60_000)
+    monkeypatch.setattr(admission_limiter, "_last_decrease", float("-inf"))
+    monkeypatch.setattr(admission_limiter, "limit", 50)
+
+    await client.get(f"/v1/cars/{uuid.uuid4()}")
+    assert admission_limiter.limit < 50
+
+    # reads pinned to the primary are judged by the primary pool
+    backed_off = admission_limiter.limit
+    await client.get(f"/v1/cars/{uuid.uuid4()}", headers={"X-Read-Consistency": "primary"})
+    assert admission_limiter.limit > backed_off
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_holds_its_slot_until_the_body_is_sent(monkeypatch):
+    from httpx import AsyncClient, ASGITransport
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+
+    limiter = make_limiter(initial=1)
+    monkeypatch.setattr(admission, "engine", fake_engine(0))
+    monkeypatch.setattr(admission, "read_engine", fake_engine(0))
+    in_flight_while_streaming = []
+
+    async def rows():
+        for row in range(3):
+            in_flight_while_streaming.append(limiter.in_flight)
+            yield f"{row}\n"
+
+    async def stream(request):
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/v1/stream", stream)])
+    app.add_middleware(AdmissionControlMiddleware, prefixes=["/v1"], limiter=limiter)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.get("/v1/stream")
+
+    assert resp.text == "0\n1\n2\n"
+    assert in_flight_while_streaming == [1, 1, 1]
+    assert limiter.in_flight == 0
@@ -1,6 +1,8 @@
 
+import json
 import uuid
 import pytest
+from datetime import datetime, timezone, timedelta
 
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
@@ -29,6 +31,45 @@ async def test_ping(client):
     assert resp.json() == {"msg": "pong"}
 
 
+@pytest.mark.asyncio
+async def test_ready_follows_lifespan_state(client, monkeypatch):
+    from app.api.main import app
+
+    monkeypatch.setattr(app.state, "ready", False, raising=False)
+    assert (await client.get("/health/ready")).status_code == 503
+
+    monkeypatch.setattr(app.state, "ready", True)
+    resp = await client.get("/health/ready")
+    assert resp.status_code == 200
+    assert resp.json() == {"msg": "ready"}
+
+
+@pytest.mark.asyncio
+async def test_sigterm_fails_readiness_before_shutdown(client):
+    import asyncio
+    import signal
+    from app.api.main import app
+    from app.core.lifecycle import _drain_on_sigterm
+
+    # stands in for the server's own SIGTERM handler
+    server_exits = []
+    original = signal.signal(signal.SIGTERM, lambda signum, frame: server_exits.append(signum))
+    try:
+        app.state.ready = True
+        _drain_on_sigterm(app, 0.05)
+        signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+
+        # still serving, but no longer ready
+        assert (await client.get("/health/ready")).status_code == 503
+        assert (await client.get("/health/ping")).status_code == 200
+        assert server_exits == []
+
+        await asyncio.sleep(0.1)
+        assert server_exits == [signal.SIGTERM]
+    finally:
+        signal.signal(signal.SIGTERM, original)
+
+
 # ── POST /v1/cars/ ──────────────────────────────────────────────────────────────
 @pytest.mark.asyncio
 async def test_add_car_returns_201_with_correct_shape(client):
@@ -147,6 +188,139 @@ async def test_get_all_cars_invalid_status_filter_returns_422(client):
     assert resp.status_code == 422
 
 
+@pytest.mark.asyncio
+async def test_get_all_cars_keyset_pagination(client):
+    ids = sorted(str(uuid.uuid4()) for _ in range(3))
+    for car_id in ids:
+        await client.post("/v1/cars/", json=make_car_payload(id=car_id))
+
+    first = await client.get("/v1/cars/", params={"limit": 2})
+    assert first.status_code == 200
+    body = first.json()
+    assert [c["id"] for c in body["cars"]] == ids[:2]
+    assert body["next_cursor"] == ids[1]
+
+    second = await client.get("/v1/cars/", params={"limit": 2, "after": body["next_cursor"]})
+    body = second.json()
+    assert [c["id"] for c in body["cars"]] == ids[2:]
+    assert body["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_all_cars_stream_ndjson(client):
+    ids = sorted(str(uuid.uuid4()) for _ in range(3))
+    for car_id in ids:
+        await client.post("/v1/cars/", json=make_car_payload(id=car_id))
+
+    resp = await client.get("/v1/cars/", params={"stream": True})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [c["id"] for c in lines] == ids
+
+
+@pytest.mark.asyncio
+async def test_get_all_cars_db_json_matches_default(client):
+    for _ in range(3):
+        await client.post("/v1/cars/", json=make_car_payload())
+
+    for params in ({}, {"limit": 2}, {"status_filter": "available"}, {"status_filter": "in use"}):
+        default = await client.get("/v1/cars/", params=params)
+        db_json = await client.get("/v1/cars/", params={**params, "db_json": True})
+        assert db_json.status_code == 200
+        assert db_json.headers["content-type"] == "application/json"
+        assert db_json.json() == default.json()
+
+
+# ── GET /v1/cars/available ──────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_get_available_cars_for_window(client):
+    now = datetime.now(timezone.utc)
+    company = f"Co-{uuid.uuid4()}"
+    free = make_car_payload(model={"company": company, "name": "Free", "year": 2024})
+    booked = make_car_payload(model={"company": company, "name": "Booked", "year": 2024})
+    maintenance = make_car_payload(model={"company": company, "name": "Fixing", "year": 2024},
+                                   status={"status": "under maintenance"})
+    older = make_car_payload(model={"company": company, "name": "Old", "year": 2010})
+    for car in (free, booked, maintenance, older):
+        await client.post("/v1/cars/", json=car)
+    await client.post("/v1/rentals/", json={"car_id": booked["id"],
+                                            "customer_name": "John Doe",
+                                            "start_date": (now + timedelta(days=2)).isoformat(),
+                                            "end_date": (now + timedelta(days=4)).isoformat()})
+
+    window = {"from": (now + timedelta(days=3)).isoformat(),
+              "to": (now + timedelta(days=5)).isoformat(),
+              "company": company,
+              "year": 2024}
+    resp = await client.get("/v1/cars/available", params=window)
+    assert resp.status_code == 200
+    assert [c["id"] for c in resp.json()["cars"]] == [free["id"]]
+
+    window["from"] = (now + timedelta(days=4, minutes=1)).isoformat()
+    resp = await client.get("/v1/cars/available", params=window)
+    assert sorted(c["id"] for c in resp.json()["cars"]) == sorted([free["id"], booked["id"]])
+
+
+@pytest.mark.asyncio
+async def test_get_available_cars_empty_window_returns_422(client):
+    now = datetime.now(timezone.utc).isoformat()
+    resp = await client.get("/v1/cars/available", params={"from": now, "to": now})
+    assert resp.status_code == 422
+
+
+# ── POST /v1/cars/bulk ──────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_bulk_add_cars_json_reports_per_row(client):
+    existing = make_car_payload()
+    await client.post("/v1/cars/", json=existing)
+    fresh = make_car_payload()
+    payload = [fresh, existing, make_car_payload(status={"status": "broken"}), fresh]
+
+    resp = await client.post("/v1/cars/bulk", json=payload)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["total"] == 4
+    assert body["created"] == 1
+    assert body["rejected"] == 3
+    assert [r["status"] for r in body["results"]] == ["created", "duplicate", "invalid", "duplicate"]
+
+    get_resp = await client.get(f"/v1/cars/{fresh['id']}")
+    assert get_resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_bulk_add_cars_ndjson(client):
+    cars = [make_car_payload(id=str(uuid.uuid4())) for _ in range(3)]
+    body = "\n".join(json.dumps(c) for c in cars) + "\nnot json\n"
+
+    resp = await client.post("/v1/cars/bulk", content=body,
+                             headers={"content-type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    assert [r["status"] for r in resp.json()["results"]] == ["created", "created", "created", "invalid"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_add_cars_csv(client):
+    car_id = str(uuid.uuid4())
+    body = f"id,company,name,year,status\n{car_id},TestCo,TestCar,2024,available\n,TestCo,NoId,2023,in use\n"
+
+    resp = await client.post("/v1/cars/bulk", content=body, headers={"content-type": "text/csv"})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status"] for r in results] == ["created", "created"]
+    assert results[0]["id"] == car_id
+
+    get_resp = await client.get(f"/v1/cars/{car_id}")
+    assert get_resp.json()["model"]["year"] == 2024
+
+
+@pytest.mark.asyncio
+async def test_bulk_add_cars_unsupported_content_type_returns_415(client):
+    resp = await client.post("/v1/cars/bulk", content="<cars/>", headers={"content-type": "application/xml"})
+    assert resp.status_code == 415
+
+
 # ── PATCH /v1/cars/{car_id} ─────────────────────────────────────────────────────
 @pytest.mark.asyncio
 async def test_update_car_model(client):
@@ -173,6 +347,32 @@ async def test_update_car_status(client):
     assert resp.json()["status"]["status"] == "in use"
 
 
+@pytest.mark.asyncio
+async def test_get_car_after_update_is_not_stale(client):
+    payload = make_car_payload()
+    await client.post("/v1/cars/", json=payload)
+    await client.get(f"/v1/cars/{payload['id']}")  # warm the cache
+
+    await client.patch(f"/v1/cars/{payload['id']}", json={"status": {"status": "under maintenance"}})
+    resp = await client.get(f"/v1/cars/{payload['id']}")
+    assert resp.json()["status"]["status"] == "under maintenance"
+
+
+@pytest.mark.asyncio
+async def test_get_car_from_replica_is_not_cached(client, db_session, monkeypatch):
+    from app.core import database
+    from app.core.cache import car_cache
+
+    payload = make_car_payload()
+    await client.post("/v1/cars/", json=payload)
+
+    # the test session stands in for a replica session
+    monkeypatch.setattr(database, "read_engine", db_session.bind)
+    resp = await client.get(f"/v1/cars/{payload['id']}")
+    assert resp.status_code == 200
+    assert car_cache.get(uuid.UUID(payload["id"])) is None
+
+
 @pytest.mark.asyncio
 async def test_update_nonexistent_car_returns_404(client):
     update = {"status": {"status": "in use"}}
@@ -180,6 +380,63 @@ async def test_update_nonexistent_car_returns_404(client):
     assert resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_update_car_empty_request_returns_car_unchanged(client):
+    payload = make_car_payload()
+    await client.post("/v1/cars/", json=payload)
+
+    resp = await client.patch(f"/v1/cars/{payload['id']}", json={})
+    assert resp.status_code == 200
+    assert resp.json()["model"] == payload["model"]
+    assert resp.json()["status"] == payload["status"]
+
+
+# ── PATCH /v1/cars/bulk/status ──────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_bulk_update_car_status_by_ids(client):
+    available = make_car_payload()
+    in_use = make_car_payload(status={"status": "in use"})
+    for payload in (available, in_use):
+        await client.post("/v1/cars/", json=payload)
+    await client.get(f"/v1/cars/{available['id']}")  # warm the cache
+    missing = str(uuid.uuid4())
+
+    resp = await client.patch("/v1/cars/bulk/status", json={"ids": [available["id"], in_use["id"], missing],
+                                                             "status": "under maintenance"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["updated"] == [available["id"]]
+    assert body["skipped_in_use"] == [in_use["id"]]
+    assert body["not_found"] == [missing]
+
+    assert (await client.get(f"/v1/cars/{available['id']}")).json()["status"]["status"] == "under maintenance"
+    assert (await client.get(f"/v1/cars/{in_use['id']}")).json()["status"]["status"] == "in use"
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_car_status_by_filter(client):
+    company = f"Depot-{uuid.uuid4()}"
+    cars = [make_car_payload(model={"company": company, "name": "TestCar", "year": year}) for year in (2020, 2020, 2021)]
+    for payload in cars:
+        await client.post("/v1/cars/", json=payload)
+
+    resp = await client.patch("/v1/cars/bulk/status", json={"company": company, "year": 2020,
+                                                             "status": "under maintenance"})
+    assert resp.status_code == 200
+    assert sorted(resp.json()["updated"]) == sorted(c["id"] for c in cars[:2])
+    assert resp.json()["not_found"] == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_car_status_needs_one_selection(client):
+    resp = await client.patch("/v1/cars/bulk/status", json={"status": "available"})
+    assert resp.status_code == 422
+
+    resp = await client.patch("/v1/cars/bulk/status", json={"ids": [str(uuid.uuid4())], "company": "TestCo",
+                                                             "status": "available"})
+    assert resp.status_code == 422
+
+
 # ── DELETE /v1/cars/{car_id} ────────────────────────────────────────────────────
 @pytest.mark.asyncio
 async def test_delete_car(client):
@@ -193,6 +450,20 @@ async def test_delete_car(client):
     assert get_resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_delete_rented_car_returns_409(client):
+    payload = make_car_payload()
+    await client.post("/v1/cars/", json=payload)
+    now = datetime.now(timezone.utc)
+    await client.post("/v1/rentals/", json={"car_id": payload["id"],
+                                            "customer_name": "John Doe",
+                                            "start_date": now.isoformat(),
+                                            "end_date": (now + timedelta(days=1)).isoformat()})
+
+    resp = await client.delete(f"/v1/cars/{payload['id']}")
+    assert resp.status_code == 409
+
+
 @pytest.mark.asyncio
 async def test_delete_nonexistent_car_returns_404(client):
     resp = await client.delete(f"/v1/cars/{uuid.uuid4()}")
@@ -202,4 +473,26 @@ async def test_delete_nonexistent_car_returns_404(client):
 @pytest.mark.asyncio
 async def test_delete_car_invalid_uuid_returns_422(client):
     resp = await client.delete("/v1/cars/not-a-uuid")
-    assert resp.status_code == 422
\ No newline at end of file
+    assert resp.status_code == 422
+
+# ── Read replica routing ────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_writes_pin_reads_to_primary(client, monkeypatch):
+    from starlette.requests import Request
+    from app.core import database
+    from app.core.config import settings
+
+    replica = object()
+    monkeypatch.setattr(settings, "DATABASE_READ_URL", "postgresql+asyncpg://replica/drivenow")
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", replica)
+
+    def request(headers=()):
+        return Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers]})
+
+    assert database.read_sessionmaker_for(request()) is replica
+    assert database.read_sessionmaker_for(request([("X-Read-Consistency", "primary")])) is database.AsyncSessionLocal
+
+    resp = await client.post("/v1/cars/", json=make_car_payload())
+    assert database.RECENT_WRITE_COOKIE in resp.cookies
+    cookie = f"{database.RECENT_WRITE_COOKIE}={resp.cookies[database.RECENT_WRITE_COOKIE]}"
+    assert database.read_sessionmaker_for(request([("Cookie", cookie)])) is database.AsyncSessionLocal
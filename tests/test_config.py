@@ -0,0 +1,35 @@
+import pytest
+from pydantic import ValidationError
+from app.core.config import Settings
+
+
+def make_settings(**overrides) -> Settings:
+    options = {"DATABASE_URL": "postgresql+asyncpg://test/test", "DB_POOL_SIZE": 5, "DB_MAX_OVERFLOW": 10,
+               "CAR_CACHE_ENABLED": True}
+    options.update(overrides)
+    return Settings(**options)
+
+
+# ── Connection budget ───────────────────────────────────────────────────────────
+def test_pools_are_not_split_without_a_budget():
+    assert make_settings(WEB_CONCURRENCY=8).worker_pool_limits == (5, 10)
+    assert make_settings().default_workers(cores=16) == 1
+
+
+def test_budget_is_split_between_workers_and_their_listeners():
+    # 80 // 8 = 10 per worker, one of them held by the cache listener
+    assert make_settings(WEB_CONCURRENCY=8, DB_MAX_CONNECTIONS=80).worker_pool_limits == (5, 4)
+    assert make_settings(WEB_CONCURRENCY=40, DB_MAX_CONNECTIONS=80).worker_pool_limits == (1, 0)
+    assert make_settings(WEB_CONCURRENCY=80, DB_MAX_CONNECTIONS=80,
+                         CAR_CACHE_ENABLED=False).worker_pool_limits == (1, 0)
+
+
+def test_workers_over_the_budget_fail_at_startup():
+    with pytest.raises(ValidationError):
+        make_settings(WEB_CONCURRENCY=64, DB_MAX_CONNECTIONS=80)
+
+
+def test_default_workers_stay_within_the_budget():
+    assert make_settings(DB_MAX_CONNECTIONS=80).default_workers(cores=8) == 8
+    assert make_settings(DB_MAX_CONNECTIONS=80).default_workers(cores=64) == 40
+    assert make_settings(DB_MAX_CONNECTIONS=80, CAR_CACHE_ENABLED=False).default_workers(cores=64) == 64
@@ -0,0 +1,301 @@
+
+import uuid
+import pytest
+from datetime import datetime, timezone, timedelta
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from app.services.MetricService import MetricService
+from app.core.latency_window import RollingLatency
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+def make_car_payload(**overrides) -> dict:
+    payload = {
+        "id": str(uuid.uuid4()),
+        "model": {
+            "company": "TestCo",
+            "name": "TestCar",
+            "year": 2024,
+        },
+        "status": {"status": "available"}
+    }
+    payload.update(overrides)
+    return payload
+
+
+# ── GET /metrics/fleetstatus ────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_fleet_status_follows_car_writes(client):
+    before = (await client.get("/metrics/fleetstatus")).json()
+
+    available = make_car_payload()
+    maintenance = make_car_payload(status={"status": "under maintenance"})
+    await client.post("/v1/cars/", json=available)
+    await client.post("/v1/cars/", json=maintenance)
+    await client.patch(f"/v1/cars/{available['id']}", json={"status": {"status": "in use"}})
+    await client.delete(f"/v1/cars/{maintenance['id']}")
+    await client.post("/v1/cars/bulk", json=[make_car_payload() for _ in range(3)])
+
+    after = (await client.get("/metrics/fleetstatus")).json()
+    assert after["available"] - before["available"] == 3
+    assert after["in_use"] - before["in_use"] == 1
+    assert after["under_maintenance"] - before["under_maintenance"] == 0
+    assert after["total"] - before["total"] == 4
+
+    active = (await client.get("/metrics/activecars")).json()
+    assert active["active_cars"] == after["total"]
+
+
+@pytest.mark.asyncio
+async def test_fleet_status_compaction_keeps_counts(client, db_session):
+    await client.post("/v1/cars/bulk", json=[make_car_payload() for _ in range(3)])
+    car = make_car_payload()
+    await client.post("/v1/cars/", json=car)
+    await client.patch(f"/v1/cars/{car['id']}", json={"status": {"status": "in use"}})
+    before = (await client.get("/metrics/fleetstatus")).json()
+
+    assert await MetricService.compact_fleet_status_counts(db_session) > 0
+    rows = (await db_session.execute(text("SELECT status FROM fleet_status_deltas"))).scalars().all()
+    assert len(rows) == len(set(rows))
+    assert (await client.get("/metrics/fleetstatus")).json() == before
+
+
+# ── GET /metrics/ongoingrentals ─────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_ongoing_rentals_counts_current_rentals_only(client):
+    before = (await client.get("/metrics/ongoingrentals")).json()["ongoing_rentals"]
+
+    now = datetime.now(timezone.utc)
+    windows = [(now - timedelta(hours=1), now + timedelta(days=1)),
+               (now + timedelta(days=5), now + timedelta(days=6))]
+    for start, end in windows:
+        car = make_car_payload()
+        await client.post("/v1/cars/", json=car)
+        await client.post("/v1/rentals/", json={"car_id": car["id"],
+                                                "customer_name": "John Doe",
+                                                "start_date": start.isoformat(),
+                                                "end_date": end.isoformat()})
+
+    after = (await client.get("/metrics/ongoingrentals")).json()["ongoing_rentals"]
+    assert after - before == 1
+
+
+@pytest.mark.asyncio
+async def test_ongoing_rentals_skip_rentals_without_end_date(client, db_session):
+    from app.models.orm import RentalTableSchema
+
+    before = (await client.get("/metrics/ongoingrentals")).json()["ongoing_rentals"]
+    car = make_car_payload()
+    await client.post("/v1/cars/", json=car)
+    db_session.add(RentalTableSchema(id=uuid.uuid4(), car_id=uuid.UUID(car["id"]), customer_name="John Doe",
+                                     start_date=datetime.now(timezone.utc) - timedelta(hours=1), end_date=None))
+    await db_session.flush()
+
+    after = (await client.get("/metrics/ongoingrentals")).json()["ongoing_rentals"]
+    assert after == before
+
+
+
+# ── Request latency histograms ──────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_latency_is_labelled_by_route_template(client):
+    labels = {"route": "/v1/cars/{car_id}", "method": "GET", "status": "404"}
+    before = REGISTRY.get_sample_value("api_request_latency_ms_count", labels) or 0
+
+    await client.get(f"/v1/cars/{uuid.uuid4()}")
+
+    assert REGISTRY.get_sample_value("api_request_latency_ms_count", labels) == before + 1
+    resp = await client.get("/metrics/avgresp")
+    assert resp.status_code == 200
+    assert resp.json()["average_response_time_in_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_made_up_methods_add_no_series(client):
+    from app.api.metrics.metrics import OTHER_METHOD, UNMATCHED_ROUTE
+    from app.core.latency_window import rolling_latency
+
+    def series():
+        return {tuple(sorted(sample.labels.items()))
+                for metric in REGISTRY.collect() if metric.name == "api_request_latency_ms"
+                for sample in metric.samples}
+
+    await client.request("X0", "/v1/cars/")  # the first one may add the OTHER series
+    before, rings = series(), set(rolling_latency._rings)
+    for method in ("X1", "X2", "X3", "X4"):
+        assert (await client.request(method, "/v1/cars/")).status_code == 405
+
+    assert series() == before
+    assert set(rolling_latency._rings) == rings
+    labels = {"route": UNMATCHED_ROUTE, "method": OTHER_METHOD, "status": "405"}
+    assert REGISTRY.get_sample_value("api_request_latency_ms_count", labels) >= 5
+
+
+# ── GET /metrics/avgresp ────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_avgresp_hit_count_counts_requests(client):
+    before = (await client.get("/metrics/avgresp")).json()["hit_count"]
+    for _ in range(3):
+        await client.get(f"/v1/cars/{uuid.uuid4()}")
+
+    after = (await client.get("/metrics/avgresp")).json()["hit_count"]
+    assert after - before == 3
+
+
+# ── GET /metrics/latency ────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_latency_percentiles_per_route(client):
+    await client.get(f"/v1/rentals/{uuid.uuid4()}")
+
+    for window in (1, 5, 15):
+        resp = await client.get("/metrics/latency", params={"window": window})
+        assert resp.status_code == 200
+        routes = {(r["method"], r["route"]): r for r in resp.json()["routes"]}
+        stats = routes[("GET", "/v1/rentals/{rental_id}")]
+        assert stats["count"] >= 1
+        assert 0 < stats["p50"] <= stats["p95"] <= stats["p99"] <= stats["max"]
+
+
+@pytest.mark.asyncio
+async def test_latency_percentiles_invalid_window_returns_422(client):
+    resp = await client.get("/metrics/latency", params={"window": 7})
+    assert resp.status_code == 422
+
+
+def test_rolling_latency_quantiles_and_expiry():
+    rolling = RollingLatency()
+    now = 1_000_000.0
+    for value in range(1, 1001):
+        rolling.record("GET", "/v1/cars/", float(value), now=now)
+
+    stats = rolling.snapshot(1, now=now)[0]
+    assert stats["count"] == 1000
+    assert stats["p50"] == pytest.approx(500, rel=0.02)
+    assert stats["p99"] == pytest.approx(990, rel=0.02)
+    assert stats["max"] == 1000
+
+    # falls out of the 1 minute window but stays in the 5 minute one
+    later = now + 120
+    assert rolling.snapshot(1, now=later) == []
+    assert rolling.snapshot(5, now=later)[0]["count"] == 1000
+
+
+def test_rolling_latency_merges_other_workers(tmp_path):
+    now = 1_000_000.0
+    first = RollingLatency(directory=str(tmp_path), worker="1")
+    second = RollingLatency(directory=str(tmp_path), worker="2")
+    for value in range(1, 101):
+        first.record("GET", "/v1/cars/", float(value), now=now)
+    second.record("GET", "/v1/cars/", 5000.0, now=now)
+    second.record("POST", "/v1/cars/", 20.0, now=now)
+    first.write(first.export(now=now))
+    second.write(second.export(now=now))
+
+    # a worker reads the others' files, not its own
+    assert {ring[0] for ring in first.read_workers()} == {"GET", "POST"}
+    routes = {(r["method"], r["route"]): r for r in first.snapshot(1, now=now, workers=first.read_workers())}
+    assert routes[("GET", "/v1/cars/")]["count"] == 101
+    assert routes[("GET", "/v1/cars/")]["max"] == 5000
+    assert routes[("POST", "/v1/cars/")]["count"] == 1
+
+    # a stopped worker's requests are no longer reported
+    second.discard()
+    assert [r["count"] for r in first.snapshot(1, now=now, workers=first.read_workers())] == [100]
+
+
+def test_rolling_latency_records_without_writing(tmp_path):
+    rolling = RollingLatency(directory=str(tmp_path), worker="1")
+    rolling.record("GET", "/v1/cars/", 10.0)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_latency_percentiles_unavailable_per_worker(client, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    resp = await client.get("/metrics/latency", params={"window": 1})
+    assert resp.status_code == 501
+
+
+# ── GET /metrics (Prometheus exposition) ────────────────────────────────────────
+def scraped_value(body: str, name: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    raise AssertionError(f"{name} not in exposition")
+
+
+@pytest.mark.asyncio
+async def test_exposition_serves_histograms_and_cached_db_gauges(client, monkeypatch):
+    from app.api.metrics.collectors import fleet_gauges
+
+    monkeypatch.setattr(fleet_gauges, "min_interval", 0)
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "api_request_latency_ms_bucket" in resp.text
+    fleet_before = scraped_value(resp.text, "fleet_cars")
+
+    # Within the refresh interval the gauges are served from memory
+    monkeypatch.setattr(fleet_gauges, "min_interval", 3600)
+    await client.post("/v1/cars/", json=make_car_payload())
+    resp = await client.get("/metrics")
+    assert scraped_value(resp.text, "fleet_cars") == fleet_before
+
+    monkeypatch.setattr(fleet_gauges, "min_interval", 0)
+    resp = await client.get("/metrics")
+    assert scraped_value(resp.text, "fleet_cars") == fleet_before + 1
+    assert 'fleet_cars_by_status{status="available"}' in resp.text
+    assert "rentals_ongoing" in resp.text
+
+
+# ── Structured request logs ─────────────────────────────────────────────────────
+def test_request_log_sampling_keeps_errors(monkeypatch):
+    from app.core.config import settings
+    from app.core.logger import should_log_request
+
+    monkeypatch.setattr(settings, "LOG_SUCCESS_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(settings, "LOG_ROUTE_SAMPLE_RATES", {"/v1/cars/{car_id}": 1.0})
+
+    assert not should_log_request("/v1/cars/", 200)
+    assert should_log_request("/v1/cars/", 404)
+    assert should_log_request("/v1/cars/", 500)
+    assert should_log_request("/v1/cars/{car_id}", 200)
+
+
+def test_json_formatter_merges_fields():
+    import json
+    import logging
+    from app.core.logger import JsonFormatter
+
+    record = logging.LogRecord("myapp.requests", logging.INFO, __file__, 1, "request %s", ("done",), None)
+    record.fields = {"route": "/v1/cars/", "status": 200}
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "request done"
+    assert entry["level"] == "INFO"
+    assert entry["route"] == "/v1/cars/"
+    assert entry["status"] == 200
+
+
+# ── Pool occupancy ──────────────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_session_checks_out_lazily_and_records_hold_time(postgres_container):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.core.database import build_engine
+
+    engine = build_engine(postgres_container["async"], "lazy_test")
+    labels = {"pool": "lazy_test"}
+    try:
+        async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+            async with session.begin():
+                assert (REGISTRY.get_sample_value("db_pool_checked_out", labels) or 0) == 0
+                await session.execute(text("SELECT 1"))
+                assert REGISTRY.get_sample_value("db_pool_checked_out", labels) == 1
+
+        assert REGISTRY.get_sample_value("db_pool_checked_out", labels) == 0
+        assert REGISTRY.get_sample_value("db_pool_hold_ms_count", labels) == 1
+    finally:
+        await engine.dispose()
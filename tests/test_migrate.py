@@ -0,0 +1,120 @@
+import pytest
+from app.core import migrate as boot_migrate
+
+
+# ── Boot time migrations ────────────────────────────────────────────────────────
+def test_migrate_skips_when_at_head(postgres_container, run_migrations):
+    assert boot_migrate.migrate(postgres_container["sync"], "auto") is False
+    assert boot_migrate.migrate(postgres_container["sync"], "check") is False
+
+
+def test_migrate_check_fails_when_behind(postgres_container, run_migrations, monkeypatch):
+    monkeypatch.setattr(boot_migrate, "head_revisions", lambda config: {"0123456789ab"})
+
+    with pytest.raises(RuntimeError):
+        boot_migrate.migrate(postgres_container["sync"], "check")
+
+
+def test_migrate_upgrades_the_database_it_checked(postgres_container, monkeypatch):
+    import psycopg2
+
+    admin_dsn = postgres_container["sync"].replace("postgresql+psycopg2", "postgresql")
+    admin = psycopg2.connect(admin_dsn)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute("CREATE DATABASE migrate_url_test")
+    try:
+        # DATABASE_URL points elsewhere, the upgrade must still go to the database passed in
+        url = postgres_container["sync"].rsplit("/", 1)[0] + "/migrate_url_test"
+        monkeypatch.setenv("DATABASE_URL", "postgresql+psycopg2://nowhere/none")
+        assert boot_migrate.migrate(url, "auto") is True
+        assert boot_migrate.migrate(url, "check") is False
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute("DROP DATABASE migrate_url_test WITH (FORCE)")
+        admin.close()
+
+
+def test_migrate_off_does_not_connect(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("connected to the database")
+    monkeypatch.setattr(boot_migrate.psycopg2, "connect", fail)
+
+    assert boot_migrate.migrate("postgresql+psycopg2://nowhere/none", "off") is False
+
+
+# ── Online migration helpers ────────────────────────────────────────────────────
+@pytest.fixture
+def migration_ops(postgres_container, run_migrations):
+    from sqlalchemy import create_engine
+    from alembic.runtime.migration import MigrationContext
+    from alembic.operations import Operations
+
+    engine = create_engine(postgres_container["sync"])
+    with engine.connect() as connection:
+        connection.exec_driver_sql("CREATE TABLE online_test (id integer PRIMARY KEY, value text)")
+        connection.exec_driver_sql("INSERT INTO online_test (id) SELECT generate_series(1, 250)")
+        connection.commit()
+
+        context = MigrationContext.configure(connection, opts={"transaction_per_migration": True})
+        with Operations.context(context):
+            yield connection
+
+        connection.rollback()
+        connection.exec_driver_sql("DROP TABLE online_test")
+        connection.commit()
+    engine.dispose()
+
+
+def test_backfill_runs_in_batches_and_resumes(migration_ops):
+    from app.core.online_migrations import backfill
+
+    migration_ops.exec_driver_sql("UPDATE online_test SET value = 'done' WHERE id <= 100")  # an interrupted run
+    migration_ops.commit()
+
+    updated = backfill("online_test", set_clause="value = 'done'", where="value IS NULL",
+                       batch_size=40, pause_seconds=0)
+    assert updated == 150
+    assert migration_ops.exec_driver_sql("SELECT count(*) FROM online_test WHERE value IS NULL").scalar() == 0
+
+
+def test_create_index_concurrently_replaces_invalid_leftover(migration_ops):
+    from app.core.online_migrations import create_index_concurrently
+
+    # What an interrupted CREATE INDEX CONCURRENTLY leaves behind
+    migration_ops.exec_driver_sql("CREATE INDEX ix_online_test_value ON online_test (value)")
+    migration_ops.exec_driver_sql("UPDATE pg_index SET indisvalid = false "
+                                  "WHERE indexrelid = 'ix_online_test_value'::regclass")
+    migration_ops.commit()
+
+    create_index_concurrently("ix_online_test_value", "online_test", ["value"])
+    valid = migration_ops.exec_driver_sql("SELECT indisvalid FROM pg_index "
+                                          "WHERE indexrelid = 'ix_online_test_value'::regclass").scalar()
+    assert valid is True
+
+
+def test_create_index_concurrently_waits_out_open_writes(postgres_container, migration_ops):
+    import threading
+    from sqlalchemy import create_engine
+    from app.core.online_migrations import create_index_concurrently
+
+    migration_ops.exec_driver_sql("SET lock_timeout = '200ms'")  # the env.py policy
+    migration_ops.commit()
+
+    # A write transaction still open when the build starts, committing a while later
+    engine = create_engine(postgres_container["sync"])
+    writer = engine.connect()
+    writer.exec_driver_sql("UPDATE online_test SET value = 'busy' WHERE id = 1")
+    commit_later = threading.Timer(1.0, writer.commit)
+    commit_later.start()
+    try:
+        create_index_concurrently("ix_online_test_value", "online_test", ["value"])
+    finally:
+        commit_later.join()
+        writer.close()
+        engine.dispose()
+
+    valid = migration_ops.exec_driver_sql("SELECT indisvalid FROM pg_index "
+                                          "WHERE indexrelid = 'ix_online_test_value'::regclass").scalar()
+    assert valid is True
+    assert migration_ops.exec_driver_sql("SHOW lock_timeout").scalar() == "200ms"
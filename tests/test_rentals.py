@@ -63,6 +63,17 @@ async def test_start_rental_nonexistent_car_returns_404(client):
     assert resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_start_rental_unavailable_car_returns_400(client):
+    car_id = await create_car(client)
+    first = await client.post("/v1/rentals/", json=make_rental_payload(car_id))
+    assert first.status_code == 201
+
+    resp = await client.post("/v1/rentals/", json=make_rental_payload(car_id))
+    assert resp.status_code == 400
+    assert (await client.get("/v1/rentals/", params={"car_id": car_id})).json()["length"] == 1
+
+
 @pytest.mark.asyncio
 async def test_start_rental_end_before_start_returns_422(client):
     car_id = await create_car(client)
@@ -130,6 +141,64 @@ async def test_start_rental_invalid_car_id_format_returns_422(client):
     assert resp.status_code == 422
 
 
+# ── POST /v1/rentals/batch ──────────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_start_rentals_batch_atomic(client):
+    car_ids = [await create_car(client) for _ in range(3)]
+    payload = {"rentals": [make_rental_payload(car_id) for car_id in car_ids]}
+
+    resp = await client.post("/v1/rentals/batch", json=payload)
+    assert resp.status_code == 201
+    body = resp.json()
+    assert sorted(r["car_id"] for r in body["created"]) == sorted(car_ids)
+    assert body["failed"] == []
+
+    for car_id in car_ids:
+        car = (await client.get(f"/v1/cars/{car_id}")).json()
+        assert car["status"]["status"] == "in use"
+
+
+@pytest.mark.asyncio
+async def test_start_rentals_batch_atomic_rejects_whole_batch(client):
+    car_id = await create_car(client)
+    missing_car_id = str(uuid.uuid4())
+    payload = {"rentals": [make_rental_payload(car_id), make_rental_payload(missing_car_id)]}
+
+    resp = await client.post("/v1/rentals/batch", json=payload)
+    assert resp.status_code == 400
+    assert [f["index"] for f in resp.json()["detail"]] == [1]
+
+    car = (await client.get(f"/v1/cars/{car_id}")).json()
+    assert car["status"]["status"] == "available"
+
+
+@pytest.mark.asyncio
+async def test_start_rentals_batch_partial(client):
+    car_id = await create_car(client)
+    busy_car_id = await create_car(client)
+    await client.post("/v1/rentals/", json=make_rental_payload(busy_car_id))
+    payload = {
+        "mode": "partial",
+        "rentals": [make_rental_payload(car_id), make_rental_payload(busy_car_id), make_rental_payload(car_id)],
+    }
+
+    resp = await client.post("/v1/rentals/batch", json=payload)
+    assert resp.status_code == 201
+    body = resp.json()
+    assert [r["car_id"] for r in body["created"]] == [car_id]
+    assert [f["index"] for f in body["failed"]] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_start_rentals_batch_over_size_limit_returns_422(client):
+    from app.models.validations.items import RENTAL_BATCH_MAX_SIZE
+
+    rental = make_rental_payload(str(uuid.uuid4()))
+    resp = await client.post("/v1/rentals/batch", json={"rentals": [rental] * (RENTAL_BATCH_MAX_SIZE + 1)})
+    assert resp.status_code == 422
+
+
+
 # ── GET /v1/rentals/{rental_id} ────────────────────────────────────────────────
 @pytest.mark.asyncio
 async def test_get_rental_by_id(client):
@@ -193,6 +262,95 @@ async def test_get_all_rentals_multiple(client):
     assert resp.json()["length"] == 3
 
 
+@pytest.mark.asyncio
+async def test_get_all_rentals_filters(client):
+    now = datetime.now(timezone.utc)
+    car_a = await create_car(client)
+    car_b = await create_car(client)
+    await client.post("/v1/rentals/", json=make_rental_payload(car_a, customer_name="Alice"))
+    await client.post("/v1/rentals/", json=make_rental_payload(
+        car_b,
+        customer_name="Bob",
+        start_date=(now + timedelta(days=10)).isoformat(),
+        end_date=(now + timedelta(days=12)).isoformat(),
+    ))
+
+    by_car = (await client.get("/v1/rentals/", params={"car_id": car_a})).json()
+    assert [r["car_id"] for r in by_car["rentals"]] == [car_a]
+
+    by_customer = (await client.get("/v1/rentals/", params={"customer_name": "Bob"})).json()
+    assert [r["car_id"] for r in by_customer["rentals"]] == [car_b]
+
+    window = {"start_from": (now + timedelta(days=5)).isoformat(),
+              "start_to": (now + timedelta(days=15)).isoformat()}
+    by_start = (await client.get("/v1/rentals/", params=window)).json()
+    assert [r["car_id"] for r in by_start["rentals"]] == [car_b]
+
+
+@pytest.mark.asyncio
+async def test_get_all_rentals_keyset_pagination(client):
+    ids = sorted(str(uuid.uuid4()) for _ in range(3))
+    for rental_id in ids:
+        car_id = await create_car(client)
+        await client.post("/v1/rentals/", json=make_rental_payload(car_id, id=rental_id))
+
+    first = (await client.get("/v1/rentals/", params={"limit": 2})).json()
+    assert [r["id"] for r in first["rentals"]] == ids[:2]
+    assert first["next_cursor"] == ids[1]
+
+    second = (await client.get("/v1/rentals/", params={"limit": 2, "after": first["next_cursor"]})).json()
+    assert [r["id"] for r in second["rentals"]] == ids[2:]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_all_rentals_db_json_matches_default(client):
+    for _ in range(3):
+        car_id = await create_car(client)
+        await client.post("/v1/rentals/", json=make_rental_payload(car_id))
+
+    for params in ({}, {"limit": 2}, {"customer_name": "Nobody"}):
+        default = (await client.get("/v1/rentals/", params=params)).json()
+        db_json = (await client.get("/v1/rentals/", params={**params, "db_json": True})).json()
+        assert db_json["length"] == default["length"]
+        assert db_json["next_cursor"] == default["next_cursor"]
+        for db_rental, rental in zip(db_json["rentals"], default["rentals"]):
+            assert db_rental["id"] == rental["id"]
+            assert db_rental["car_id"] == rental["car_id"]
+            for field in ("start_date", "end_date"):
+                assert datetime.fromisoformat(db_rental[field]) == datetime.fromisoformat(rental[field])
+
+
+# ── GET /v1/rentals/overlapping ────────────────────────────────────────────────
+@pytest.mark.asyncio
+async def test_get_overlapping_rentals(client):
+    now = datetime.now(timezone.utc)
+    current_car = await create_car(client)
+    future_car = await create_car(client)
+    await client.post("/v1/rentals/", json=make_rental_payload(current_car))
+    await client.post("/v1/rentals/", json=make_rental_payload(
+        future_car,
+        start_date=(now + timedelta(days=10)).isoformat(),
+        end_date=(now + timedelta(days=12)).isoformat(),
+    ))
+
+    window = {"from": (now + timedelta(days=1)).isoformat(), "to": (now + timedelta(days=10)).isoformat()}
+    resp = await client.get("/v1/rentals/overlapping", params=window)
+    assert resp.status_code == 200
+    assert [r["car_id"] for r in resp.json()["rentals"]] == [current_car]
+
+    window = {"from": (now + timedelta(days=1)).isoformat(), "to": (now + timedelta(days=11)).isoformat()}
+    resp = await client.get("/v1/rentals/overlapping", params=window)
+    assert sorted(r["car_id"] for r in resp.json()["rentals"]) == sorted([current_car, future_car])
+
+
+@pytest.mark.asyncio
+async def test_get_overlapping_rentals_empty_window_returns_422(client):
+    now = datetime.now(timezone.utc).isoformat()
+    resp = await client.get("/v1/rentals/overlapping", params={"from": now, "to": now})
+    assert resp.status_code == 422
+
+
 # ── DELETE /v1/rentals/{rental_id} ────────────────────────────────────────────
 @pytest.mark.asyncio
 async def test_delete_rental(client):
@@ -207,6 +365,19 @@ async def test_delete_rental(client):
     assert get_resp.status_code == 404
 
 
+@pytest.mark.asyncio
+async def test_rental_start_and_stop_update_car_status(client):
+    car_id = await create_car(client)
+    await client.get(f"/v1/cars/{car_id}")  # warm the cache
+    payload = make_rental_payload(car_id)
+
+    await client.post("/v1/rentals/", json=payload)
+    assert (await client.get(f"/v1/cars/{car_id}")).json()["status"]["status"] == "in use"
+
+    await client.delete(f"/v1/rentals/{payload['id']}")
+    assert (await client.get(f"/v1/cars/{car_id}")).json()["status"]["status"] == "available"
+
+
 @pytest.mark.asyncio
 async def test_delete_nonexistent_rental_returns_404(client):
     resp = await client.delete(f"/v1/rentals/{uuid.uuid4()}")